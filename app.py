@@ -1,26 +1,53 @@
-import oandapyV20
-from oandapyV20.endpoints.instruments import InstrumentsCandles
-from datetime import datetime, timedelta, timezone
 import time
-from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
 import os
 import sys
-import json
 from telegram import Bot
 from telegram.request import HTTPXRequest
 import asyncio
 
+# Load .env before the modules below read their configuration
 load_dotenv()
 
+from broadcast import Broadcaster, is_unreachable
+from crt import check_crt as crt_rule
+from digest import WHATSAPP_MESSAGE_LIMIT, SignalCoalescer, format_digest
+from metrics import SIGNALS, SUBSCRIBERS, serve_metrics, signal_direction
+from oanda_client import AsyncCandleClient
+from candle_store import get_store, sync_store
+from subscribers import ANY, SubscriberStore
+from outbox import Outbox, DeliveryWorkers
+from resample import bucket_start
+from notifier import TWILIO_POOL_SIZE, WHATSAPP_RECIPIENTS, Notifier, whatsapp_from_env
+from scanner import WATCHLIST, GRANULARITIES, DISPLAY_NAMES, display_name, fetch_signal, scan_cycle, watchlist_pairs
+from scheduler import CandleCloseScheduler
+from sharding import SCAN_PROCESSES, ShardedScanner
+from cluster import CLUSTER_MODE, Cluster
+from tracing import span, trace, tracer
+from streaming import StreamingDetector, price_stream, replay_stream, load_ticks, candles_match
+
 ACCESS_TOKEN = os.getenv('OANDA_ACCESS_TOKEN')
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+OANDA_ACCOUNT_ID = os.getenv('OANDA_ACCOUNT_ID')
+# Fan-out concurrency is sized to the HTTPXRequest connection pool
+TELEGRAM_POOL_SIZE = int(os.getenv('TELEGRAM_POOL_SIZE', '64'))
 
 # Testing mode configuration
 TEST_MODE = os.getenv('TEST_MODE', 'false').lower() == 'true' or '--test' in sys.argv
 FORCE_CRT_SIGNAL = os.getenv('FORCE_CRT_SIGNAL', 'none').lower()
 TEST_TELEGRAM = '--testt' in sys.argv
 
+# Streaming mode: build candles locally from the pricing stream (STREAM_REPLAY=ticks.csv replays a recording)
+STREAM_MODE = os.getenv('STREAM_MODE', 'false').lower() == 'true' or '--stream' in sys.argv
+STREAM_REPLAY = os.getenv('STREAM_REPLAY')
+STREAM_RECONCILE_DELAY = float(os.getenv('STREAM_RECONCILE_DELAY', '5'))
+
+# Prometheus /metrics port (disabled when unset)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# Poll Telegram for /start, /stop and /watch commands while the bot runs
+BOT_COMMANDS = os.getenv('BOT_COMMANDS', 'false').lower() == 'true'
+
 if TEST_MODE:
     print("⚠️ TEST MODE ENABLED ⚠️")
     if FORCE_CRT_SIGNAL != 'none':
@@ -29,58 +56,103 @@ if TEST_MODE:
 if TEST_TELEGRAM:
     print("📱 TELEGRAM TEST MODE ENABLED 📱")
 
-client = oandapyV20.API(access_token=ACCESS_TOKEN, environment="practice")
+OANDA_CLIENT_CONFIG = dict(
+    access_token=ACCESS_TOKEN,
+    environment="practice",
+    max_connections=int(os.getenv('OANDA_MAX_CONNECTIONS', '20')),
+    timeout=float(os.getenv('OANDA_TIMEOUT', '10')),
+    max_retries=int(os.getenv('OANDA_MAX_RETRIES', '3'))
+)
+client = AsyncCandleClient(**OANDA_CLIENT_CONFIG)
+
+# SCAN_PROCESSES=N shards the watchlist scan across N worker processes
+sharded_scanner = None
+
+# CLUSTER_MODE=true coordinates replicas sharing the subscribers DB (one scan per close, sharded delivery)
+cluster = None
 
 # Simple Telegram bot - just for sending messages
 telegram_bot = None
+broadcaster = None
+# Polling application when bot commands are enabled
+telegram_app = None
 
-# --- Load/Save Authorized Users ---
-USERS_FILE = "users.json"
+# --- Subscriber store (SQLite, migrated once from the legacy users.json) ---
+USERS_FILE = os.getenv('USERS_FILE', 'users.json')
 
-def load_users():
-    try:
-        with open(USERS_FILE, 'r') as f:
-            data = json.load(f)
-            return set(data.get('authorized_users', []))
-    except FileNotFoundError:
-        return set()
-    except json.JSONDecodeError:
-        print("⚠️ Error reading users.json, creating new file")
-        return set()
-
-def save_users(users):
-    with open(USERS_FILE, 'w') as f:
-        json.dump({'authorized_users': list(users)}, f, indent=2)
-
-authorized_users = load_users()
-
-# --- Send Telegram message to all authorized users ---
+subscribers = SubscriberStore()
+if subscribers.is_empty():
+    migrated = subscribers.migrate_from_json(USERS_FILE)
+    if migrated:
+        print(f"📦 Migrated {migrated} subscribers from {USERS_FILE}")
+
+# Signals are queued durably here and drained by async delivery workers
+outbox = Outbox(subscribers.path)
+delivery_workers = None
+
+# Channels without an outbox (WhatsApp via Twilio) are sent straight from the notifier
+notifier = Notifier()
+whatsapp = whatsapp_from_env()
+if whatsapp and WHATSAPP_RECIPIENTS:
+    notifier.add_channel('whatsapp', whatsapp, lambda: WHATSAPP_RECIPIENTS, concurrency=TWILIO_POOL_SIZE)
+
+def get_broadcaster():
+    global broadcaster
+    if broadcaster is None or broadcaster.bot is not telegram_bot:
+        broadcaster = Broadcaster(telegram_bot, concurrency=TELEGRAM_POOL_SIZE)
+    return broadcaster
+
+# --- Queue a batch of signals as one digest per subscriber; returns without waiting for delivery ---
+def publish_digest(batch):
+    fresh, queued = outbox.enqueue_digest(batch, format_digest)
+    if queued:
+        print(f"📬 Queued {len(fresh)} signal(s) as {len(queued)} message(s), "
+              f"{sum(fanout for _, fanout in queued)} deliveries")
+    if notifier.channels and fresh:
+        for part in format_digest([message for message, _, _ in fresh], WHATSAPP_MESSAGE_LIMIT):
+            notifier.notify_soon(part)
+
+# Signals are coalesced per close: scan_watchlist flushes at the end of each cycle, the stream detector per boundary
+coalescer = SignalCoalescer(publish_digest)
+
+# route = (instrument, granularity, direction) limits the fan-out to users whose /watch rules match;
+# with the signal candle's start time it also keys the sent-signal dedup index
+def publish_signal(message, route=None, candle_time=None):
+    coalescer.add(message, route, candle_time)
+
+def start_delivery_workers():
+    global delivery_workers
+    delivery_workers = DeliveryWorkers(outbox, get_broadcaster(), subscribers,
+                                       shard=cluster.shard if cluster else None)
+    delivery_workers.start()
+
+# --- Send Telegram message to all subscribers ---
 async def send_telegram_message(message):
-    if not telegram_bot or not authorized_users:
+    subscriber_count = subscribers.count()
+    SUBSCRIBERS.set(subscriber_count, channel='telegram')
+    if not telegram_bot or not subscriber_count:
         print("⚠️ No Telegram bot or no subscribers")
         return
     
-    success_count = 0
-    fail_count = 0
+    stats = await get_broadcaster().broadcast(subscribers.iter_ids(), message)
     
-    users_list = list(authorized_users)
-    
-    for user_id in users_list:
-        try:
-            await telegram_bot.send_message(
-                chat_id=user_id,
-                text=message,
-                parse_mode='Markdown'
-            )
-            success_count += 1
-        except Exception as e:
-            print(f"❌ Failed to send Telegram to {user_id}: {e}")
-            fail_count += 1
+    # Record delivery state; users who blocked the bot are skipped from now on
+    subscribers.mark_delivered(stats['delivered'])
+    unreachable = [(u, e) for u, e in stats['failures'] if is_unreachable(e)]
+    if unreachable:
+        subscribers.mark_failed(unreachable, blocked=True)
+        print(f"🚫 Marked {len(unreachable)} unreachable users as blocked")
+    transient = [(u, e) for u, e in stats['failures'] if not is_unreachable(e)]
+    for user_id, e in transient:
+        print(f"❌ Failed to send Telegram to {user_id}: {e}")
+    if transient:
+        subscribers.mark_failed(transient)
     
+    latency = f"p50: {stats['p50']*1000:.0f}ms, p99: {stats['p99']*1000:.0f}ms, total: {stats['elapsed']:.2f}s"
     if TEST_MODE or TEST_TELEGRAM:
-        print(f"🧪 [TEST] Telegram sent to {success_count}/{len(authorized_users)} users")
+        print(f"🧪 [TEST] Telegram sent to {stats['sent']}/{subscriber_count} users ({latency})")
     else:
-        print(f"📤 Telegram sent to {success_count} users (Failed: {fail_count})")
+        print(f"📤 Telegram sent to {stats['sent']} users (Failed: {stats['failed']}, {latency})")
 
 # --- Test Telegram with mock data ---
 async def test_telegram_messages():
@@ -95,7 +167,7 @@ async def test_telegram_messages():
     
     for i, msg in enumerate(mock_signals, 1):
         print(f"\n📊 Test {i}/{len(mock_signals)}: {msg}")
-        print(f"   📤 Sending to {len(authorized_users)} users...")
+        print(f"   📤 Sending to {subscribers.count()} users...")
         
         await send_telegram_message(msg)
         
@@ -108,66 +180,67 @@ async def test_telegram_messages():
     print("\n" + "="*60)
     print("✅ TELEGRAM TEST COMPLETED!")
     print(f"📊 Total messages sent: {len(mock_signals)}")
-    print(f"👥 Subscribers: {len(authorized_users)}")
+    print(f"👥 Subscribers: {subscribers.count()}")
     print("="*60 + "\n")
 
 # --- CRT Signal Logic ---
 def check_crt(c1, c2):
-    if TEST_MODE and FORCE_CRT_SIGNAL == 'bullish':
-        return "🟢 Bullish CRT"
-    elif TEST_MODE and FORCE_CRT_SIGNAL == 'bearish':
-        return "🔴 Bearish CRT"
-    
-    l1 = float(c1['l'])
-    h1 = float(c1['h'])
-    close1 = float(c1['c'])
-
-    l2 = float(c2['l'])
-    h2 = float(c2['h'])
-    close2 = float(c2['c'])
-
-    if l1 > l2 and close2 > l1 and h1 > h2:
-        return "🟢 Bullish CRT"
-    elif h1 < h2 and close2 < h1 and l1 < l2: 
-        return "🔴 Bearish CRT"
-    return None
-
-# --- Fetch 3 candles and evaluate signal ---
-async def fetch_candles():
-    params = {
-        "granularity": "H1",
-        "count": 3,
-        "price": "M"
-    }
-    
-    try:
-        request = InstrumentsCandles(instrument="XAU_USD", params=params)
-        client.request(request)
-        candles = request.response['candles']
+    return crt_rule(c1, c2, force=FORCE_CRT_SIGNAL if TEST_MODE else None)
 
-        if len(candles) < 3:
-            print(f"⚠️ Not enough candle data for GOLD.")
-            return
-        
-        c1 = candles[0]['mid']
-        c2 = candles[1]['mid']
-        
-        if TEST_MODE:
-            print(f"🧪 [TEST] GOLD - C1 (setup): {c1}, C2 (sweep): {c2}")
+# --- Sync new candles into the local store and evaluate signal ---
+async def fetch_candles(instrument="XAU_USD", granularity="H1", closed_at=None):
+    msg = await fetch_signal(client, instrument, granularity, check_crt, closed_at, verbose=TEST_MODE)
+    if msg:
+        SIGNALS.inc(granularity=granularity, direction=signal_direction(msg))
+    return msg
+
+def start_sharded_scanner(processes=SCAN_PROCESSES, **client_overrides):
+    global sharded_scanner
+    sharded_scanner = ShardedScanner(
+        watchlist_pairs(GRANULARITIES), processes,
+        client_config={**OANDA_CLIENT_CONFIG, **client_overrides},
+        force=FORCE_CRT_SIGNAL if TEST_MODE else None,
+        verbose=TEST_MODE
+    )
+    sharded_scanner.start()
+
+# --- Scan the whole watchlist for the candles that just closed ---
+# drift = how late the scheduler woke for this close (traced as the cycle's first stage)
+async def scan_watchlist(granularities, closed_at=None, drift=None):
+    pairs = watchlist_pairs(granularities)
+    print(f"🚀 Fetching {'/'.join(granularities)} candles for {len(WATCHLIST)} instrument(s)...")
+    
+    with trace('cycle', granularities='/'.join(granularities), pairs=len(pairs),
+               close=closed_at.isoformat() if closed_at else None) as cycle:
+        if drift is not None:
+            tracer.event('schedule.wake', drift)
         
-        result = check_crt(c1, c2)
+        with span('scan'):
+            if sharded_scanner:
+                signals, scan_elapsed = await sharded_scanner.scan(granularities, closed_at)
+                for _, granularity, msg in signals:
+                    SIGNALS.inc(granularity=granularity, direction=signal_direction(msg))
+            else:
+                async def scan_one(instrument, granularity):
+                    return await fetch_candles(instrument, granularity, closed_at)
+                
+                signals, scan_elapsed = await scan_cycle(scan_one, pairs, concurrency=client.max_connections)
         
-        if result:
-            msg = f"[GOLD/H1] {result}"
-            print(msg)
-            await send_telegram_message(msg)
-        else:
-            print("ℹ️ No CRT signal detected for GOLD")
-    except Exception as e:
-        print(f"❌ Error fetching GOLD candles: {e}")
+        publish_started = time.monotonic()
+        if not signals:
+            print("ℹ️ No CRT signal detected")
+        with span('publish', signals=len(signals)):
+            for instrument, granularity, msg in signals:
+                print(msg)
+                candle_time = bucket_start(granularity, int(closed_at.timestamp()) - 1) if closed_at else None
+                publish_signal(msg, (instrument, granularity, signal_direction(msg)), candle_time)
+            coalescer.flush()
+        cycle.set(signals=len(signals))
+    
+    return {'signals': len(signals), 'scan': scan_elapsed, 'publish': time.monotonic() - publish_started}
 
-# --- Main loop ---
-async def run_bot():
+# --- Telegram sender setup ---
+async def init_telegram():
     global telegram_bot
     
     # Initialize simple Telegram bot (no polling, just for sending)
@@ -175,91 +248,182 @@ async def run_bot():
         try:
             print("🤖 Initializing Telegram bot...")
             request = HTTPXRequest(
-                connection_pool_size=8,
+                connection_pool_size=TELEGRAM_POOL_SIZE,
                 connect_timeout=30.0,
                 read_timeout=30.0,
                 write_timeout=30.0,
                 pool_timeout=30.0
             )
-            telegram_bot = Bot(token=TELEGRAM_BOT_TOKEN, request=request)
+            if BOT_COMMANDS:
+                telegram_bot = await start_command_app(request)
+            else:
+                telegram_bot = Bot(token=TELEGRAM_BOT_TOKEN, request=request)
             
             # Test sending a startup message
-            test_msg = "🚀 CRT Bot Started!\n📊 Monitoring GOLD H1 candles..."
-            await send_telegram_message(test_msg)
-            print(f"✅ Telegram bot ready! Subscribers: {len(authorized_users)}")
+            test_msg = (
+                f"🚀 CRT Bot Started!\n📊 Monitoring {', '.join(display_name(i) for i in WATCHLIST)} "
+                f"{'/'.join(GRANULARITIES)} candles..."
+            )
+            # In a cluster only the first delivery shard announces itself
+            if not cluster or cluster.shard()[0] == 0:
+                await send_telegram_message(test_msg)
+            start_delivery_workers()
+            print(f"✅ Telegram bot ready! Subscribers: {subscribers.count()}")
         except Exception as e:
             print(f"⚠️ Telegram initialization failed: {e}")
             print("📱 Continuing without Telegram...")
             telegram_bot = None
     else:
         print("⚠️ TELEGRAM_BOT_TOKEN not configured")
+
+# --- Main loop ---
+async def run_bot():
+    await init_telegram()
+    
+    print(f"🚀 CRT Bot started... Waiting for {'/'.join(GRANULARITIES)} candle closes...")
+    
+    # Sleep until the next candle close, then scan whatever just closed
+    async def on_close(close, granularities, drift):
+        print(f"🕒 {'/'.join(granularities)} close at {close:%Y-%m-%d %H:%M} UTC (woke {drift*1000:.0f}ms late)")
+        if cluster:
+            await cluster.exclusive(f"scan:{int(close.timestamp())}",
+                                    lambda: scan_watchlist(granularities, closed_at=close, drift=drift))
+        else:
+            await scan_watchlist(granularities, closed_at=close, drift=drift)
+    
+    scheduler = CandleCloseScheduler(GRANULARITIES, respect_market_hours=not TEST_MODE)
+    await scheduler.run(on_close)
+
+# --- Streaming mode: local candles from ticks, alert at the exact close ---
+async def run_stream_bot():
+    await init_telegram()
+    
+    async def on_signal(instrument, granularity, result, bar, closed_at):
+        SIGNALS.inc(granularity=granularity, direction=signal_direction(result))
+        msg = f"[{display_name(instrument)}/{granularity}] {result}"
+        if STREAM_REPLAY:
+            print(msg)
+        else:
+            print(f"{msg} (⚡ {(time.time() - closed_at)*1000:.0f}ms after close)")
+        publish_signal(msg, (instrument, granularity, signal_direction(result)), bar.time)
     
-    print("🚀 CRT Bot started... Waiting for H1 candle closes...")
+    # Later, check the locally built candles against OANDA's REST candles
+    async def reconcile(instrument, granularity, c1, c2, result):
+        store = get_store(instrument, granularity)
+        await sync_store(client, store)
+        with store.locked(exclusive=False):
+            i = store.index_of(c2.time)
+            if i is None or i == 0:
+                print(f"⚠️ No REST candle yet for {instrument}/{granularity} at {c2.time}")
+                return
+            rest_c1, rest_c2 = store.rows(i - 1, i + 1)
+        if not (candles_match(c1, rest_c1) and candles_match(c2, rest_c2)):
+            print(f"⚠️ Local {instrument}/{granularity} candles differ from REST: {c2} vs {rest_c2}")
+        rest_result = check_crt(rest_c1, rest_c2)
+        if rest_result != result:
+            print(f"⚠️ REST candles give {rest_result} for {instrument}/{granularity}, stream gave {result}")
+    
+    if STREAM_REPLAY:
+        # A recording has no live REST counterpart to reconcile against
+        print(f"📼 Replaying ticks from {STREAM_REPLAY}...")
+        detector = StreamingDetector(GRANULARITIES, check_crt, on_signal, on_batch=coalescer.flush)
+        await detector.consume(replay_stream(load_ticks(STREAM_REPLAY)))
+        return
     
-    # Main CRT detection loop
-    processed_signals = set()
+    # A boundary's signals go out as one digest as soon as they are all in
+    detector = StreamingDetector(GRANULARITIES, check_crt, on_signal, reconcile, STREAM_RECONCILE_DELAY,
+                                 on_batch=coalescer.flush)
     
+    print(f"📡 Streaming prices for {len(WATCHLIST)} instrument(s)...")
     while True:
-        now = datetime.now(ZoneInfo("Asia/Kolkata"))
-        minute = now.minute
-        second = now.second
-        day_of_week = now.weekday()
-        hour = now.hour
-        
-        print(f"Day: {day_of_week}, Hour: {hour}, Minute: {minute}, Second: {second}")
-        
-        in_time_window = False
-        
-        if TEST_MODE:
-            in_time_window = True
+        try:
+            await detector.run(price_stream(ACCESS_TOKEN, OANDA_ACCOUNT_ID, WATCHLIST), respect_market_hours=not TEST_MODE)
+        except Exception as e:
+            print(f"❌ Price stream dropped: {e}, reconnecting in 5s...")
+            await asyncio.sleep(5)
+
+async def main():
+    global cluster
+    if CLUSTER_MODE:
+        # Streaming replicas all detect locally; the sent-signal index keeps them from double-sending
+        cluster = Cluster(subscribers.path)
+        cluster.start()
+    if METRICS_PORT:
+        await serve_metrics(METRICS_PORT)
+        print(f"📈 Metrics on :{METRICS_PORT}/metrics")
+    SUBSCRIBERS.set(subscribers.count(), channel='telegram')
+    SUBSCRIBERS.set(len(WHATSAPP_RECIPIENTS) if notifier.channels else 0, channel='whatsapp')
+    if SCAN_PROCESSES and not STREAM_MODE:
+        start_sharded_scanner()
+    
+    try:
+        if STREAM_MODE:
+            await run_stream_bot()
         else:
-            if day_of_week == 0:
-                if hour >= 3 or hour == 0:
-                    in_time_window = True
-            elif 1 <= day_of_week <= 3:
-                in_time_window = True
-            elif day_of_week == 4:
-                if hour <= 0 and minute <= 10:
-                    in_time_window = True
-                elif hour >= 3:
-                    in_time_window = True
-        
-        time_key = f"{now.year}-{now.month}-{now.day}-{hour}"
-        
-        if in_time_window and minute == 30 and 0 <= second <= 10:
-            if time_key not in processed_signals:
-                print("🚀 Fetching H1 candles for GOLD...")
-                await fetch_candles()
-                
-                processed_signals.add(time_key)
-                
-                # Keep only last 24 hours of processed signals
-                if len(processed_signals) > 24:
-                    processed_signals.pop()
-        elif not in_time_window:
-            print("⏸️ Outside trading hours - waiting...")
-        
-        await asyncio.sleep(1)
+            await run_bot()
+    finally:
+        # Queue anything a cancelled cycle left unflushed before shutting down
+        coalescer.flush()
+        if delivery_workers:
+            await delivery_workers.stop()
+        if sharded_scanner:
+            sharded_scanner.stop()
+        await stop_command_app()
+        await notifier.close()
+        await client.close()
+        if cluster:
+            await cluster.stop()
 
-# --- Test mode for Telegram (for local testing with commands) ---
-async def run_telegram_test():
-    global telegram_bot
+# --- Bot commands: subscribe/unsubscribe and per-user signal routing ---
+WATCH_USAGE = (
+    "Usage: /watch <instrument|all> [timeframe|all] [bullish|bearish|all]\n"
+    "e.g. /watch GOLD H1 bullish, /watch EUR_USD H4, /watch all"
+)
+
+# /watch arguments -> (instrument, granularity, direction), '*' for anything left out
+def parse_rule(args):
+    args = [a.strip() for a in args if a.strip()]
+    if len(args) > 3:
+        raise ValueError(WATCH_USAGE)
+    instrument, granularity, direction = (args + ['all'] * 3)[:3]
+    aliases = {name.upper(): code for code, name in DISPLAY_NAMES.items()}
+    
+    instrument = instrument.upper().replace('/', '_')
+    instrument = ANY if instrument in ('ALL', ANY) else aliases.get(instrument, instrument)
+    if instrument != ANY and instrument not in WATCHLIST:
+        raise ValueError(f"⚠️ Not watched: {args[0]}. Instruments: {', '.join(display_name(i) for i in WATCHLIST)}")
+    
+    granularity = granularity.upper()
+    granularity = ANY if granularity in ('ALL', ANY) else granularity
+    if granularity != ANY and granularity not in GRANULARITIES:
+        raise ValueError(f"⚠️ Not scanned: {args[1]}. Timeframes: {', '.join(GRANULARITIES)}")
     
-    from telegram.ext import Application, CommandHandler
+    direction = direction.lower()
+    direction = ANY if direction in ('all', 'both', ANY) else direction
+    if direction not in (ANY, 'bullish', 'bearish'):
+        raise ValueError(WATCH_USAGE)
+    return instrument, granularity, direction
+
+def describe_rule(rule):
+    instrument, granularity, direction = rule
+    return (f"{'all instruments' if instrument == ANY else display_name(instrument)} "
+            f"{'(all timeframes)' if granularity == ANY else granularity} "
+            f"{'bullish + bearish' if direction == ANY else direction}")
+
+def command_handlers():
     from telegram import Update
-    from telegram.ext import ContextTypes
+    from telegram.ext import CommandHandler, ContextTypes
     
     async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         username = update.effective_user.username or "Unknown"
         
-        if user_id not in authorized_users:
-            authorized_users.add(user_id)
-            save_users(authorized_users)
+        if subscribers.subscribe(user_id, username):
+            SUBSCRIBERS.set(subscribers.count(), channel='telegram')
             await update.message.reply_text(
                 f"✅ Welcome {username}!\n"
                 f"🎉 You're now subscribed to CRT signals!\n"
-                f"📊 You'll receive GOLD H1 CRT notifications.\n\n"
+                f"📊 You'll receive all CRT notifications. Narrow them down with /watch.\n\n"
                 f"Your User ID: `{user_id}`",
                 parse_mode='Markdown'
             )
@@ -272,33 +436,112 @@ async def run_telegram_test():
                 parse_mode='Markdown'
             )
     
+    async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user_id = update.effective_user.id
+        
+        if subscribers.unsubscribe(user_id):
+            SUBSCRIBERS.set(subscribers.count(), channel='telegram')
+            await update.message.reply_text("👋 You've been unsubscribed from CRT signals. Send /start to rejoin.")
+            print(f"👋 User unsubscribed: {user_id}")
+        else:
+            await update.message.reply_text("ℹ️ You're not subscribed. Send /start to subscribe.")
+    
+    async def watch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user_id = update.effective_user.id
+        if not context.args:
+            await update.message.reply_text(WATCH_USAGE)
+            return
+        if not subscribers.is_subscribed(user_id):
+            await update.message.reply_text("ℹ️ You're not subscribed. Send /start to subscribe.")
+            return
+        try:
+            rule = parse_rule(context.args)
+        except ValueError as e:
+            await update.message.reply_text(str(e))
+            return
+        
+        if subscribers.watch(user_id, *rule):
+            await update.message.reply_text(f"🔔 Watching {describe_rule(rule)}")
+        else:
+            await update.message.reply_text(f"ℹ️ Already watching {describe_rule(rule)}")
+    
+    async def unwatch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user_id = update.effective_user.id
+        if not context.args:
+            subscribers.watch(user_id)
+            await update.message.reply_text("🔔 Cleared your filters, you'll get every signal again.")
+            return
+        try:
+            rule = parse_rule(context.args)
+        except ValueError as e:
+            await update.message.reply_text(str(e))
+            return
+        
+        if subscribers.unwatch(user_id, *rule):
+            await update.message.reply_text(f"🔕 Stopped watching {describe_rule(rule)}")
+        else:
+            await update.message.reply_text(f"ℹ️ You weren't watching {describe_rule(rule)}. See /watching")
+    
+    async def watching(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        rules = subscribers.watches(update.effective_user.id)
+        if not rules:
+            await update.message.reply_text("ℹ️ You're not subscribed. Send /start to subscribe.")
+            return
+        lines = "\n".join(f"• {describe_rule(rule)}" for rule in rules)
+        await update.message.reply_text(f"🔔 Your signals:\n{lines}")
+    
+    return [
+        CommandHandler("start", start),
+        CommandHandler("stop", stop),
+        CommandHandler("watch", watch),
+        CommandHandler("unwatch", unwatch),
+        CommandHandler("watching", watching),
+    ]
+
+# Telegram application that polls for commands; returns its bot for sending
+async def start_command_app(request):
+    global telegram_app
+    from telegram.ext import Application
+    
+    telegram_app = Application.builder().token(TELEGRAM_BOT_TOKEN).request(request).build()
+    for handler in command_handlers():
+        telegram_app.add_handler(handler)
+    
+    await telegram_app.initialize()
+    await telegram_app.start()
+    await telegram_app.updater.start_polling(drop_pending_updates=True)
+    return telegram_app.bot
+
+async def stop_command_app():
+    global telegram_app
+    if telegram_app is None:
+        return
+    await telegram_app.updater.stop()
+    await telegram_app.stop()
+    await telegram_app.shutdown()
+    telegram_app = None
+
+# --- Test mode for Telegram (for local testing with commands) ---
+async def run_telegram_test():
+    global telegram_bot
+    
     print("🤖 Starting Telegram bot for testing...")
     
     request = HTTPXRequest(
-        connection_pool_size=8,
+        connection_pool_size=TELEGRAM_POOL_SIZE,
         connect_timeout=30.0,
         read_timeout=30.0,
         write_timeout=30.0,
         pool_timeout=30.0
     )
+    telegram_bot = await start_command_app(request)
     
-    telegram_app = Application.builder().token(TELEGRAM_BOT_TOKEN).request(request).build()
-    telegram_app.add_handler(CommandHandler("start", start))
-    
-    telegram_bot = telegram_app.bot
-    
-    await telegram_app.initialize()
-    await telegram_app.start()
-    await telegram_app.updater.start_polling(drop_pending_updates=True)
-    
-    print(f"✅ Telegram bot ready! Current subscribers: {len(authorized_users)}")
+    print(f"✅ Telegram bot ready! Current subscribers: {subscribers.count()}")
     
     await asyncio.sleep(2)
     await test_telegram_messages()
     
-    await telegram_app.updater.stop()
-    await telegram_app.stop()
-    await telegram_app.shutdown()
+    await stop_command_app()
 
 if __name__ == "__main__":
     if TEST_TELEGRAM:
@@ -315,4 +558,4 @@ if __name__ == "__main__":
         print("4. Test Telegram: python test.py --testt")
         print("="*50 + "\n")
     
-    asyncio.run(run_bot())
+    asyncio.run(main())
@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import glob
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from dotenv import load_dotenv
+
+from candle_store import CANDLE_STORE_DIR, MAX_CANDLES_PER_REQUEST, CandleStore, format_candle_time
+from candles import CandleBatch
+from oanda_client import AsyncCandleClient, CandleFetchError
+from scanner import GRANULARITIES, GRANULARITY_SECONDS, WATCHLIST
+from scheduler import market_open
+
+# --- Parallel historical backfill into the candle store ---
+# python backfill.py --from 2020-01-01 --granularities M1,H1 --instruments EUR_USD,XAU_USD
+# Safe to run next to a live bot: the merge rewrites a store under its lock (see CandleStore.locked)
+
+# OANDA allows ~120 requests/second per token; stay well under it by default
+BACKFILL_RATE = float(os.getenv('BACKFILL_RATE', '50'))
+BACKFILL_CONCURRENCY = int(os.getenv('BACKFILL_CONCURRENCY', '16'))
+
+def parse_date(value):
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+
+# from/to windows of at most one request's worth of candles
+def chunk_ranges(start, end, granularity, candles=MAX_CANDLES_PER_REQUEST - 1):
+    seconds = GRANULARITY_SECONDS[granularity]
+    span = seconds * candles
+    t = start // seconds * seconds
+    while t < end:
+        yield t, min(t + span, end)
+        t += span
+
+# A missing candle is a gap only if the market was open when it should have started
+# (OANDA also skips candles with no ticks, so quiet M1 minutes show up here too)
+def find_gaps(times, granularity):
+    seconds = GRANULARITY_SECONDS[granularity]
+    jumps = np.flatnonzero(np.diff(times) > seconds * 1.5)
+    return [(int(times[i]), int(times[i + 1])) for i in jumps
+            if market_open(datetime.fromtimestamp(int(times[i]) + seconds, timezone.utc))]
+
+# --- One (instrument, granularity): chunks are staged as .npz files until every one is in ---
+class BackfillJob:
+    def __init__(self, instrument, granularity, start, end, root=CANDLE_STORE_DIR):
+        self.instrument = instrument
+        self.granularity = granularity
+        self.store = CandleStore(instrument, granularity, root)
+        self.staging = os.path.join(self.store.path, '.backfill')
+        self.chunks = list(chunk_ranges(start, end, granularity))
+        self.failed = 0
+
+    def chunk_path(self, start, end):
+        return os.path.join(self.staging, f"{start}-{end}.npz")
+
+    # Finished chunks survive an interrupted run, so a rerun only fetches the rest
+    def pending(self):
+        return [(s, e) for s, e in self.chunks if not os.path.exists(self.chunk_path(s, e))]
+
+    def save_chunk(self, start, end, batch):
+        os.makedirs(self.staging, exist_ok=True)
+        path = self.chunk_path(start, end)
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, **batch.arrays())
+        os.replace(path + '.tmp', path)
+
+    # Merge staged chunks with what the store already has, dedup by time, validate, rewrite
+    def merge(self):
+        # Held exclusively from the read to the rewrite, so candles a running bot appends meanwhile
+        # either land before the read or wait and are deduplicated against the merged history
+        with self.store.locked():
+            return self._merge()
+
+    def _merge(self):
+        parts = [self.store.batch()]
+        for path in glob.glob(os.path.join(self.staging, '*.npz')):
+            with np.load(path) as chunk:
+                parts.append(CandleBatch.from_arrays({name: chunk[name] for name in chunk.files}))
+        merged = {name: np.concatenate([getattr(p, name) for p in parts]) for name in CandleBatch.__slots__}
+
+        # Stable sort keeps the stored candle when a chunk repeats it
+        order = np.argsort(merged['time'], kind='stable')
+        times = merged['time'][order]
+        keep = np.ones(len(times), dtype=bool)
+        keep[1:] = times[1:] != times[:-1]
+        batch = CandleBatch.from_arrays({name: values[order][keep] for name, values in merged.items()})
+
+        invalid = int(np.count_nonzero((batch.h < batch.l) | (batch.h < np.maximum(batch.o, batch.c)) |
+                                       (batch.l > np.minimum(batch.o, batch.c)) | (batch.l <= 0)))
+        report = {
+            'candles': len(batch),
+            'added': len(batch) - len(self.store),
+            'duplicates': int(len(keep) - np.count_nonzero(keep)),
+            'gaps': find_gaps(batch.time, self.granularity),
+            'invalid': invalid,
+        }
+        self.store.replace(batch)
+        shutil.rmtree(self.staging, ignore_errors=True)
+        return report
+
+async def download_chunk(client, job, start, end):
+    response = await client.candles(job.instrument, {
+        'granularity': job.granularity,
+        'price': 'M',
+        'from': format_candle_time(start),
+        'to': format_candle_time(end),
+    })
+    job.save_chunk(start, end, CandleBatch.from_oanda(response['candles']))
+
+# Pacing is the client's request governor (backs off by itself when OANDA throttles)
+async def run_backfill(client, jobs, concurrency=BACKFILL_CONCURRENCY):
+    queue = asyncio.Queue()
+    # Interleave instruments so one long history doesn't hog the pool
+    pending = [[(job, s, e) for s, e in job.pending()] for job in jobs]
+    for i in range(max((len(p) for p in pending), default=0)):
+        for p in pending:
+            if i < len(p):
+                queue.put_nowait(p[i])
+    total = queue.qsize()
+    skipped = sum(len(job.chunks) for job in jobs) - total
+    print(f"📥 Backfilling {total} chunk(s) for {len(jobs)} series"
+          f"{f' ({skipped} already downloaded)' if skipped else ''}...")
+
+    started = time.monotonic()
+    done = 0
+
+    async def worker():
+        nonlocal done
+        while not queue.empty():
+            job, start, end = queue.get_nowait()
+            try:
+                await download_chunk(client, job, start, end)
+            except CandleFetchError as e:
+                job.failed += 1
+                print(f"❌ {job.instrument}/{job.granularity} {format_candle_time(start)}: {e}")
+            done += 1
+            if done % 100 == 0:
+                print(f"   {done}/{total} chunks ({done / (time.monotonic() - started):.1f}/s)")
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    print(f"⏱️ Downloaded {total} chunk(s) in {time.monotonic() - started:.1f}s")
+
+    for job in jobs:
+        name = f"{job.instrument}/{job.granularity}"
+        if job.failed:
+            print(f"⚠️ {name}: {job.failed} chunk(s) failed, rerun to resume before merging")
+            continue
+        report = job.merge()
+        gaps = report['gaps']
+        largest = max((b - a for a, b in gaps), default=0) / 3600
+        print(f"✅ {name}: {report['candles']} candles (+{report['added']}), {report['duplicates']} duplicate(s), "
+              f"{len(gaps)} gap(s) in market hours (largest {largest:.1f}h), {report['invalid']} invalid")
+    return jobs
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Download candle history into the local candle store")
+    parser.add_argument("--from", dest="start", required=True, help="start date, e.g. 2020-01-01")
+    parser.add_argument("--to", dest="end", help="end date (default: now)")
+    parser.add_argument("--instruments", default=','.join(WATCHLIST))
+    parser.add_argument("--granularities", default=','.join(GRANULARITIES))
+    parser.add_argument("--concurrency", type=int, default=BACKFILL_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=BACKFILL_RATE, help="max requests/second")
+    parser.add_argument("--root", default=CANDLE_STORE_DIR)
+    parser.add_argument("--environment", default="practice")
+    parser.add_argument("--base-url", help="override the OANDA REST host (e.g. a local fake)")
+    args = parser.parse_args()
+
+    start = parse_date(args.start)
+    end = parse_date(args.end) if args.end else int(time.time())
+    jobs = []
+    for granularity in args.granularities.split(','):
+        # Stop one candle short of now so the in-progress bar is never staged as final
+        last_closed = min(end, int(time.time()) - GRANULARITY_SECONDS[granularity])
+        for instrument in args.instruments.split(','):
+            jobs.append(BackfillJob(instrument, granularity, start, last_closed, args.root))
+
+    async def main():
+        client = AsyncCandleClient(os.getenv('OANDA_ACCESS_TOKEN'), args.environment, base_url=args.base_url,
+                                   max_connections=args.concurrency, rate=args.rate)
+        try:
+            await run_backfill(client, jobs, args.concurrency)
+        finally:
+            await client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+import argparse
+import csv
+import time
+
+import numpy as np
+
+from candle_store import CandleStore
+from candles import CandleBatch, candle_timestamp
+
+# --- Load OHLC history into arrays ---
+def candles_to_arrays(candles, price='mid'):
+    return CandleBatch.from_oanda(candles, price).arrays()
+
+# CSV columns: time,o,h,l,c (time as RFC3339 or unix seconds)
+def load_csv(path):
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    times = [r['time'] for r in rows]
+    if times and not times[0].lstrip('-').isdigit():
+        times = [candle_timestamp(t) for t in times]
+    return {
+        'time': np.array(times, dtype=np.int64),
+        'o': np.array([r['o'] for r in rows], dtype=np.float64),
+        'h': np.array([r['h'] for r in rows], dtype=np.float64),
+        'l': np.array([r['l'] for r in rows], dtype=np.float64),
+        'c': np.array([r['c'] for r in rows], dtype=np.float64),
+    }
+
+# --- Vectorized CRT over every consecutive (c1, c2) pair ---
+# Same rule as crt.check_crt: strict=True is app.py's, strict=False onada.py's
+def crt_masks(h, l, c, strict=True):
+    h1, l1 = h[:-1], l[:-1]
+    h2, l2, close2 = h[1:], l[1:], c[1:]
+
+    bullish = (l1 > l2) & (close2 > l1)
+    bearish = (h1 < h2) & (close2 < h1)
+    if strict:
+        bullish &= h1 > h2
+        bearish &= l1 < l2
+    # check_crt tests bullish first
+    bearish &= ~bullish
+    return bullish, bearish
+
+def crt_signals(arrays, strict=True):
+    bullish, bearish = crt_masks(arrays['h'], arrays['l'], arrays['c'], strict)
+    # Signal index is the sweep candle (c2)
+    return np.flatnonzero(bullish) + 1, np.flatnonzero(bearish) + 1
+
+# --- Forward returns from the close of the sweep candle ---
+def forward_returns(close, indices, horizon, direction):
+    indices = indices[indices + horizon < len(close)]
+    entry = close[indices]
+    returns = (close[indices + horizon] - entry) / entry
+    return returns * direction
+
+def return_stats(returns):
+    if len(returns) == 0:
+        return {'count': 0, 'hit_rate': 0.0, 'mean': 0.0, 'median': 0.0, 'std': 0.0}
+    return {
+        'count': int(len(returns)),
+        'hit_rate': float(np.mean(returns > 0)),
+        'mean': float(np.mean(returns)),
+        'median': float(np.median(returns)),
+        'std': float(np.std(returns)),
+    }
+
+def run_backtest(arrays, strict=True, horizons=(1, 3, 5)):
+    bullish, bearish = crt_signals(arrays, strict)
+    close = arrays['c']
+    stats = {}
+    for horizon in horizons:
+        stats[horizon] = {
+            'bullish': return_stats(forward_returns(close, bullish, horizon, 1)),
+            'bearish': return_stats(forward_returns(close, bearish, horizon, -1)),
+        }
+    return {'bullish': bullish, 'bearish': bearish, 'stats': stats}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vectorized CRT backtest over historical candles")
+    parser.add_argument("csv", nargs="?", help="CSV with time,o,h,l,c columns")
+    parser.add_argument("--store", nargs=2, metavar=("INSTRUMENT", "GRANULARITY"),
+                        help="read history from the local candle store instead of a CSV")
+    parser.add_argument("--loose", action="store_true", help="use onada.py's rule (no h1>h2 / l1<l2)")
+    parser.add_argument("--horizons", default="1,3,5", help="forward return horizons in candles")
+    args = parser.parse_args()
+
+    if args.store:
+        arrays = CandleStore(*args.store).arrays()
+    elif args.csv:
+        arrays = load_csv(args.csv)
+    else:
+        parser.error("pass a CSV file or --store INSTRUMENT GRANULARITY")
+    horizons = [int(h) for h in args.horizons.split(',')]
+
+    started = time.perf_counter()
+    result = run_backtest(arrays, strict=not args.loose, horizons=horizons)
+    elapsed = time.perf_counter() - started
+
+    print(f"📊 {len(arrays['c'])} candles, {len(result['bullish'])} bullish / "
+          f"{len(result['bearish'])} bearish signals in {elapsed*1000:.1f}ms")
+    for horizon, sides in result['stats'].items():
+        for side, s in sides.items():
+            print(f"   +{horizon} {side:8} n={s['count']:<6} hit={s['hit_rate']:.1%} "
+                  f"mean={s['mean']:+.5f} median={s['median']:+.5f} std={s['std']:.5f}")
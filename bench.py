@@ -0,0 +1,154 @@
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from governor import OANDA_RATE
+
+# --- End-to-end latency benchmark against local OANDA/Telegram stand-ins ---
+# python bench.py --instruments 200 --subscribers 1000 --granularities H1,H4 --cycles 3
+
+def summarize(name, samples, unit_scale=1000, unit="ms"):
+    from broadcast import percentile
+    if not samples:
+        return f"   {name:16} n=0"
+    return (f"   {name:16} n={len(samples):<6} p50={percentile(samples, 50)*unit_scale:8.1f}{unit} "
+            f"p90={percentile(samples, 90)*unit_scale:8.1f}{unit} p99={percentile(samples, 99)*unit_scale:8.1f}{unit} "
+            f"max={max(samples)*unit_scale:8.1f}{unit}")
+
+async def run_benchmark(args):
+    # Point the store at a scratch dir before candle_store/app.py read their config
+    store_dir = tempfile.mkdtemp(prefix='crt-bench-')
+    os.environ['CANDLE_STORE_DIR'] = store_dir
+    os.environ['SUBSCRIBERS_DB'] = os.path.join(store_dir, 'subscribers.db')
+    # No legacy users.json import: the load is exactly --subscribers
+    os.environ['USERS_FILE'] = os.path.join(store_dir, 'users.json')
+    import scanner
+    from fakes import FakeOanda, FakeTelegram, FaultInjector, start_server
+    from scanner import GRANULARITY_SECONDS
+    from scheduler import CandleCloseScheduler
+    scanner.WATCHLIST[:] = [f"BENCH_{i:04d}" for i in range(args.instruments)]
+
+    import app
+    from broadcast import Broadcaster
+    from oanda_client import AsyncCandleClient
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+
+    granularities = args.granularities.split(',')
+    # Past closes where every benchmarked timeframe closes together (OANDA alignment)
+    scheduler = CandleCloseScheduler(granularities, respect_market_hours=False)
+    t = datetime.fromtimestamp(time.time() - 2 * (args.cycles + 1) * max(GRANULARITY_SECONDS[g] for g in granularities),
+                               timezone.utc)
+    closes = []
+    while len(closes) < args.cycles:
+        t, due = scheduler.next_fire(t)
+        if len(due) == len(granularities):
+            closes.append(t)
+
+    oanda = FakeOanda(int(closes[0].timestamp()), signal_rate=args.signal_rate, faults=FaultInjector(
+        args.oanda_latency / 1000, args.oanda_error_rate, args.oanda_429_rate, seed=1),
+        rate_limit=args.oanda_rate_limit)
+    telegram = FakeTelegram(faults=FaultInjector(
+        args.telegram_latency / 1000, args.telegram_error_rate, args.telegram_429_rate, seed=2))
+    oanda_runner, oanda_url = await start_server(oanda.app)
+    telegram_runner, telegram_url = await start_server(telegram.app)
+
+    fetch_latencies = []
+    send_latencies = []
+
+    class TimedCandleClient(AsyncCandleClient):
+        async def candles(self, instrument, params):
+            started = time.monotonic()
+            try:
+                return await super().candles(instrument, params)
+            finally:
+                fetch_latencies.append(time.monotonic() - started)
+
+    class TimedBot(Bot):
+        async def send_message(self, *a, **kw):
+            started = time.monotonic()
+            try:
+                return await super().send_message(*a, **kw)
+            finally:
+                send_latencies.append(time.monotonic() - started)
+
+    app.client = TimedCandleClient('bench-token', base_url=oanda_url, max_connections=args.oanda_pool, backoff=0.05,
+                                   rate=args.oanda_rate)
+    request = HTTPXRequest(connection_pool_size=args.telegram_pool, pool_timeout=30.0)
+    app.telegram_bot = TimedBot('123456:BENCH', base_url=f"{telegram_url}/bot", request=request)
+    app.broadcaster = Broadcaster(app.telegram_bot, concurrency=args.telegram_pool,
+                                  global_rate=args.telegram_rate, per_chat_rate=args.telegram_rate)
+    app.subscribers.subscribe_many(range(1, args.subscribers + 1))
+    app.start_delivery_workers()
+    if args.processes:
+        # Worker processes build their own (untimed) OANDA clients against the fake
+        app.start_sharded_scanner(args.processes, access_token='bench-token', base_url=oanda_url,
+                                  max_connections=args.oanda_pool, backoff=0.05, rate=args.oanda_rate)
+
+    cycles = []
+    try:
+        for close in closes:
+            oanda.close = int(close.timestamp())
+            deliveries_before = len(telegram.deliveries)
+            started = time.monotonic()
+            stats = await app.scan_watchlist(granularities, closed_at=close)
+            delivery_started = time.monotonic()
+            await app.outbox.join()
+            stats['delivery'] = time.monotonic() - delivery_started
+            stats['end_to_end'] = time.monotonic() - started
+            stats['delivered'] = len(telegram.deliveries) - deliveries_before
+            cycles.append(stats)
+    finally:
+        await app.delivery_workers.stop()
+        if app.sharded_scanner:
+            app.sharded_scanner.stop()
+        await app.client.close()
+        await request.shutdown()
+        await oanda_runner.cleanup()
+        await telegram_runner.cleanup()
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+    scan_total = sum(c['scan'] for c in cycles)
+    delivery_total = sum(c['delivery'] for c in cycles)
+    delivered = sum(c['delivered'] for c in cycles)
+    print("\n" + "="*60)
+    print(f"📊 BENCHMARK: {args.instruments} instruments x {len(granularities)} timeframes, "
+          f"{args.subscribers} subscribers, {args.cycles} cycle(s)")
+    print("="*60)
+    print(summarize("oanda fetch", fetch_latencies))
+    print(summarize("scan cycle", [c['scan'] for c in cycles]))
+    print(summarize("telegram send", send_latencies))
+    print(summarize("outbox publish", [c['publish'] for c in cycles]))
+    print(summarize("delivery", [c['delivery'] for c in cycles]))
+    print(summarize("close->last msg", [c['end_to_end'] for c in cycles]))
+    print(f"   signals={sum(c['signals'] for c in cycles)} delivered={delivered} "
+          f"oanda_requests={oanda.requests} oanda_429s={oanda.throttled} telegram_requests={telegram.requests} "
+          f"oanda_rate={app.client.governor.rate:.0f}/s")
+    print(f"   throughput: {len(fetch_latencies)/max(scan_total, 1e-9):.0f} fetches/s, "
+          f"{delivered/max(delivery_total, 1e-9):.0f} msgs/s")
+    print("="*60 + "\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CRT bot end-to-end latency benchmark")
+    parser.add_argument("--instruments", type=int, default=50)
+    parser.add_argument("--subscribers", type=int, default=500)
+    parser.add_argument("--granularities", default="H1")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--processes", type=int, default=0, help="shard the scan across N worker processes")
+    parser.add_argument("--signal-rate", type=float, default=0.1, help="chance a sweep bar forms a CRT")
+    parser.add_argument("--oanda-latency", type=float, default=20.0, help="ms per candles request")
+    parser.add_argument("--oanda-error-rate", type=float, default=0.0)
+    parser.add_argument("--oanda-429-rate", type=float, default=0.0)
+    parser.add_argument("--oanda-pool", type=int, default=20)
+    parser.add_argument("--oanda-rate-limit", type=int, default=0, help="fake server 429s above this many requests/s")
+    parser.add_argument("--oanda-rate", type=float, default=OANDA_RATE, help="governor ceiling (requests/s, 0 = off)")
+    parser.add_argument("--telegram-latency", type=float, default=30.0, help="ms per sendMessage")
+    parser.add_argument("--telegram-error-rate", type=float, default=0.0)
+    parser.add_argument("--telegram-429-rate", type=float, default=0.0)
+    parser.add_argument("--telegram-pool", type=int, default=64)
+    parser.add_argument("--telegram-rate", type=float, default=1000.0, help="token bucket rate (msgs/s)")
+    asyncio.run(run_benchmark(parser.parse_args()))
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import time
+from datetime import timedelta
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+from metrics import BROADCAST_SECONDS, SEND_FAILURES, SEND_RETRIES, SEND_SECONDS
+from tracing import span
+
+# Telegram Bot API limits: ~30 messages/second overall, ~1 message/second per chat
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+TELEGRAM_PER_CHAT_RATE = float(os.getenv('TELEGRAM_PER_CHAT_RATE', '1'))
+MAX_SEND_ATTEMPTS = 3
+
+CHANNEL_NAMES = {'telegram': 'Telegram', 'whatsapp': 'WhatsApp'}
+
+def channel_name(channel):
+    return CHANNEL_NAMES.get(channel, channel.capitalize())
+
+# --- Token bucket limiter ---
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# --- Per-chat spacing (1 msg/sec per chat by default) ---
+class PerChatLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_allowed = {}
+
+    async def acquire(self, chat_id):
+        now = time.monotonic()
+        ready_at = self.next_allowed.get(chat_id, now)
+        self.next_allowed[chat_id] = max(ready_at, now) + self.interval
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+    def prune(self):
+        now = time.monotonic()
+        for chat_id in [c for c, t in self.next_allowed.items() if t < now]:
+            del self.next_allowed[chat_id]
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+# Channel-neutral flood limit (Telegram raises its own RetryAfter)
+class RateLimited(Exception):
+    def __init__(self, retry_after, message="rate limited"):
+        super().__init__(f"{message}, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+# Errors that mean the chat will never accept messages again (user blocked the bot, chat deleted)
+def is_unreachable(error):
+    if isinstance(error, Forbidden) or getattr(error, 'unreachable', False):
+        return True
+    return isinstance(error, BadRequest) and 'chat not found' in str(error).lower()
+
+def retry_after_seconds(error):
+    delay = error.retry_after
+    if isinstance(delay, timedelta):
+        return delay.total_seconds()
+    return float(delay)
+
+# --- Concurrent fan-out to all subscribers ---
+# `bot` is anything with an async send_message(chat_id=, text=, parse_mode=) (telegram.Bot, notifier.TwilioWhatsApp)
+class Broadcaster:
+    def __init__(self, bot, concurrency=8, global_rate=TELEGRAM_GLOBAL_RATE, per_chat_rate=TELEGRAM_PER_CHAT_RATE,
+                 channel='telegram'):
+        self.bot = bot
+        self.channel = channel
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(global_rate)
+        self.per_chat = PerChatLimiter(per_chat_rate)
+        # Set when Telegram answers 429 - every sender waits until then
+        self.paused_until = 0.0
+
+    async def _wait_for_pause(self):
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _send_one(self, chat_id, text, parse_mode):
+        for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+            waited = time.perf_counter()
+            await self._wait_for_pause()
+            await self.per_chat.acquire(chat_id)
+            await self.bucket.acquire()
+            sent_at = time.perf_counter()
+            try:
+                with span('send', channel=self.channel, chat_id=chat_id, attempt=attempt,
+                          waited=round(sent_at - waited, 6)):
+                    await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                SEND_SECONDS.observe(time.perf_counter() - sent_at, channel=self.channel)
+                return True, None
+            except (RetryAfter, RateLimited) as e:
+                SEND_RETRIES.inc(channel=self.channel)
+                delay = retry_after_seconds(e)
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                print(f"⏳ {channel_name(self.channel)} flood limit hit, pausing {delay:.1f}s "
+                      f"(attempt {attempt}/{MAX_SEND_ATTEMPTS})")
+            except Exception as e:
+                SEND_FAILURES.inc(channel=self.channel)
+                return False, e
+        SEND_FAILURES.inc(channel=self.channel)
+        return False, RuntimeError("gave up after repeated RetryAfter")
+
+    # user_ids can be any iterable (e.g. a paged DB cursor); workers pull from it lazily
+    async def broadcast(self, user_ids, text, parse_mode='Markdown', concurrency=None):
+        started = time.monotonic()
+        ids = iter(user_ids)
+        delivered = []
+        latencies = []
+        failures = []
+
+        async def worker():
+            for chat_id in ids:
+                ok, error = await self._send_one(chat_id, text, parse_mode)
+                if ok:
+                    delivered.append(chat_id)
+                    latencies.append(time.monotonic() - started)
+                else:
+                    failures.append((chat_id, error))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency or self.concurrency)))
+        self.per_chat.prune()
+        BROADCAST_SECONDS.observe(time.monotonic() - started, channel=self.channel)
+
+        return {
+            'sent': len(delivered),
+            'delivered': delivered,
+            'failed': len(failures),
+            'failures': failures,
+            'elapsed': time.monotonic() - started,
+            'p50': percentile(latencies, 50),
+            'p99': percentile(latencies, 99),
+        }
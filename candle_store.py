@@ -0,0 +1,196 @@
+import fcntl
+import os
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+from candles import PRICE_KEYS, CandleBatch
+from tracing import span
+
+CANDLE_STORE_DIR = os.getenv('CANDLE_STORE_DIR', 'data/candles')
+# How many candles to pull when a store is empty
+CANDLE_STORE_BOOTSTRAP = int(os.getenv('CANDLE_STORE_BOOTSTRAP', '500'))
+# OANDA's per-request candle cap
+MAX_CANDLES_PER_REQUEST = 5000
+
+# One raw little-endian file per column: append-only and memory-mappable
+COLUMNS = {
+    'time': np.dtype('<i8'),
+    'o': np.dtype('<f8'),
+    'h': np.dtype('<f8'),
+    'l': np.dtype('<f8'),
+    'c': np.dtype('<f8'),
+    'volume': np.dtype('<i8'),
+}
+
+def format_candle_time(ts):
+    return datetime.fromtimestamp(int(ts), timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+# --- Per-instrument, per-granularity columnar candle store ---
+# A store can be open in several processes at once (the bot, its scan workers, a backfill). Writers hold an
+# exclusive flock on <path>/.lock, readers a shared one, and every locked section re-reads the row count from
+# disk, so nobody works from a length cached before another process appended or rewrote the columns.
+class CandleStore:
+    def __init__(self, instrument, granularity, root=CANDLE_STORE_DIR):
+        self.instrument = instrument
+        self.granularity = granularity
+        self.path = os.path.join(root, instrument, granularity)
+        os.makedirs(self.path, exist_ok=True)
+        self._lock_depth = 0
+        with self.locked():
+            self._repair()
+
+    def _file(self, column):
+        return os.path.join(self.path, f"{column}.bin")
+
+    # Nested sections run under the outermost lock (merge -> batch/replace inside one exclusive hold)
+    @contextmanager
+    def locked(self, exclusive=True):
+        if self._lock_depth:
+            self._lock_depth += 1
+            try:
+                yield self
+            finally:
+                self._lock_depth -= 1
+            return
+        fd = os.open(os.path.join(self.path, '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._lock_depth = 1
+            self.length = min(self._rows_on_disk())
+            yield self
+        finally:
+            self._lock_depth = 0
+            os.close(fd)
+
+    def _rows_on_disk(self):
+        rows = []
+        for column, dtype in COLUMNS.items():
+            try:
+                rows.append(os.path.getsize(self._file(column)) // dtype.itemsize)
+            except FileNotFoundError:
+                rows.append(0)
+        return rows
+
+    # A crash mid-replace is rolled forward (or its unfinished temp files dropped);
+    # a crash mid-append can leave columns with different lengths
+    def _repair(self):
+        if os.path.exists(os.path.join(self.path, 'replace.pending')):
+            print(f"⚠️ Finishing an interrupted rewrite of {self.path}")
+            self._finish_replace()
+        for column in COLUMNS:
+            if os.path.exists(self._file(column) + '.tmp'):
+                os.remove(self._file(column) + '.tmp')
+        rows = self._rows_on_disk()
+        self.length = min(rows)
+        if len(set(rows)) > 1:
+            print(f"⚠️ Truncating torn append in {self.path} to {self.length} candles")
+            for column, dtype in COLUMNS.items():
+                with open(self._file(column), 'ab') as f:
+                    f.truncate(self.length * dtype.itemsize)
+
+    def __len__(self):
+        with self.locked(exclusive=False):
+            return self.length
+
+    # A memmap keeps the file it was opened on, so it stays consistent after the lock is released
+    def column(self, name):
+        with self.locked(exclusive=False):
+            if self.length == 0:
+                return np.empty(0, dtype=COLUMNS[name])
+            return np.memmap(self._file(name), dtype=COLUMNS[name], mode='r', shape=(self.length,))
+
+    def arrays(self):
+        with self.locked(exclusive=False):
+            return {name: self.column(name) for name in COLUMNS}
+
+    def batch(self, start=0, stop=None):
+        return CandleBatch.from_arrays(self.arrays())[start:stop]
+
+    def last_time(self):
+        with self.locked(exclusive=False):
+            if self.length == 0:
+                return None
+            return int(self.column('time')[-1])
+
+    def index_of(self, ts):
+        with self.locked(exclusive=False):
+            times = self.column('time')
+            i = int(np.searchsorted(times, ts))
+            if i < self.length and times[i] == ts:
+                return i
+            return None
+
+    def rows(self, start, stop):
+        return list(self.batch(start, stop))
+
+    def tail(self, n):
+        with self.locked(exclusive=False):
+            return self.rows(max(0, self.length - n), self.length)
+
+    # Append completed candles newer than the last stored one; returns how many were added
+    def append(self, candles, price='mid'):
+        batch = candles if isinstance(candles, CandleBatch) else CandleBatch.from_oanda(candles, price)
+        with self.locked():
+            last = self.last_time()
+            if last is not None:
+                batch = batch[int(np.searchsorted(batch.time, last, side='right')):]
+            if not len(batch):
+                return 0
+
+            for column, dtype in COLUMNS.items():
+                with open(self._file(column), 'ab') as f:
+                    f.write(np.ascontiguousarray(getattr(batch, column), dtype=dtype).tobytes())
+            self.length += len(batch)
+            return len(batch)
+
+    # Rewrite every column (backfill merges older history in front of what's stored).
+    # All columns are written and synced first; the replace.pending marker then commits the rewrite,
+    # so a crash either leaves the old columns or is rolled forward by _repair, never a mix.
+    def replace(self, batch):
+        with self.locked():
+            for column, dtype in COLUMNS.items():
+                with open(self._file(column) + '.tmp', 'wb') as f:
+                    f.write(np.ascontiguousarray(getattr(batch, column), dtype=dtype).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            with open(os.path.join(self.path, 'replace.pending'), 'wb') as f:
+                os.fsync(f.fileno())
+            self._finish_replace()
+            self.length = len(batch)
+
+    def _finish_replace(self):
+        for column in COLUMNS:
+            if os.path.exists(self._file(column) + '.tmp'):
+                os.replace(self._file(column) + '.tmp', self._file(column))
+        os.remove(os.path.join(self.path, 'replace.pending'))
+
+# --- Incremental sync: only request candles after the last stored time ---
+async def sync_store(client, store, price='M'):
+    added = 0
+    while True:
+        params = {"granularity": store.granularity, "price": price}
+        last = store.last_time()
+        if last is None:
+            params["count"] = CANDLE_STORE_BOOTSTRAP
+        else:
+            params["from"] = format_candle_time(last)
+            params["includeFirst"] = "false"
+            params["count"] = MAX_CANDLES_PER_REQUEST
+
+        response = await client.candles(store.instrument, params)
+        with span('parse', candles=len(response['candles'])):
+            batch = CandleBatch.from_oanda(response['candles'], PRICE_KEYS[price])
+        added += store.append(batch)
+        # A full page means we were offline for a while - keep catching up
+        if last is None or len(response['candles']) < MAX_CANDLES_PER_REQUEST:
+            return added
+
+_stores = {}
+
+def get_store(instrument, granularity, root=CANDLE_STORE_DIR):
+    key = (root, instrument, granularity)
+    if key not in _stores:
+        _stores[key] = CandleStore(instrument, granularity, root)
+    return _stores[key]
@@ -0,0 +1,102 @@
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# OANDA price component for each `price` request letter
+PRICE_KEYS = {'M': 'mid', 'B': 'bid', 'A': 'ask'}
+
+def loads(body):
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+def candle_timestamp(value):
+    # RFC3339 with nanoseconds (2024-01-02T03:00:00.000000000Z) or UNIX seconds ("1704164400.000000000")
+    if 'T' not in value:
+        return int(float(value))
+    return int(datetime.fromisoformat(value[:19]).replace(tzinfo=timezone.utc).timestamp())
+
+def candle_timestamps(values):
+    if 'T' not in values[0]:
+        return np.array(values, dtype=np.float64).astype(np.int64)
+    return np.array([v[:19] for v in values], dtype='datetime64[s]').astype(np.int64)
+
+# --- One candle, prices converted to float once ---
+class Candle:
+    __slots__ = ('time', 'o', 'h', 'l', 'c', 'volume')
+
+    def __init__(self, time, o, h, l, c, volume=0):
+        self.time = time
+        self.o = o
+        self.h = h
+        self.l = l
+        self.c = c
+        self.volume = volume
+
+    @classmethod
+    def from_oanda(cls, raw, price='mid'):
+        p = raw[price]
+        return cls(candle_timestamp(raw['time']), float(p['o']), float(p['h']), float(p['l']), float(p['c']),
+                   int(raw.get('volume', 0)))
+
+    def __eq__(self, other):
+        return isinstance(other, Candle) and all(getattr(self, k) == getattr(other, k) for k in Candle.__slots__)
+
+    def __repr__(self):
+        when = datetime.fromtimestamp(self.time, timezone.utc).strftime("%Y-%m-%d %H:%M")
+        return f"Candle({when} o={self.o:g} h={self.h:g} l={self.l:g} c={self.c:g})"
+
+# --- Struct-of-arrays window of candles (views, never copies of the store's memmaps) ---
+class CandleBatch:
+    __slots__ = ('time', 'o', 'h', 'l', 'c', 'volume')
+
+    def __init__(self, time, o, h, l, c, volume):
+        self.time = time
+        self.o = o
+        self.h = h
+        self.l = l
+        self.c = c
+        self.volume = volume
+
+    # Complete candles only; the bar still forming is never stored or evaluated
+    @classmethod
+    def from_oanda(cls, raw_candles, price='mid'):
+        raw_candles = [r for r in raw_candles if r.get('complete', True)]
+        if not raw_candles:
+            return cls.empty()
+        prices = [r[price] for r in raw_candles]
+        # numpy parses the price strings and ISO times in C, one pass per column
+        return cls(
+            candle_timestamps([r['time'] for r in raw_candles]),
+            *(np.array([p[k] for p in prices], dtype=np.float64) for k in ('o', 'h', 'l', 'c')),
+            np.array([r.get('volume', 0) for r in raw_candles], dtype=np.int64),
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(*(arrays[name] for name in CandleBatch.__slots__))
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, np.int64), *(np.empty(0, np.float64) for _ in range(4)), np.empty(0, np.int64))
+
+    def __len__(self):
+        return len(self.time)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return CandleBatch(*(getattr(self, name)[i] for name in CandleBatch.__slots__))
+        return Candle(int(self.time[i]), float(self.o[i]), float(self.h[i]), float(self.l[i]), float(self.c[i]),
+                      int(self.volume[i]))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in CandleBatch.__slots__}
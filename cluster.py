@@ -0,0 +1,133 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import time
+
+from subscribers import transaction
+
+# --- Replica coordination over the shared SQLite database (CLUSTER_MODE=true) ---
+# Every replica heartbeats into `replicas`. One replica per candle close wins the scan lease and does the
+# detection; the others wait and take over if it stops renewing. Outbox deliveries are split across
+# live replicas by user_id, so adding replicas adds broadcast throughput.
+CLUSTER_MODE = os.getenv('CLUSTER_MODE', 'false').lower() == 'true'
+REPLICA_ID = os.getenv('REPLICA_ID') or f"{socket.gethostname()}:{os.getpid()}"
+CLUSTER_HEARTBEAT = float(os.getenv('CLUSTER_HEARTBEAT', '5'))
+# A replica (or lease holder) silent for this long is considered dead
+CLUSTER_TTL = float(os.getenv('CLUSTER_TTL', '20'))
+# Finished leases are kept this long so late replicas still see the close as done
+LEASE_RETENTION = 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS replicas (
+    replica_id TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+class Cluster:
+    def __init__(self, path, replica_id=REPLICA_ID, heartbeat=CLUSTER_HEARTBEAT, ttl=CLUSTER_TTL):
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.replica_id = replica_id
+        self.interval = heartbeat
+        self.ttl = ttl
+        self.started_at = time.time()
+        # (index, count) of this replica among the live ones
+        self.position = (0, 1)
+        self.task = None
+
+    # --- Membership ---
+    def heartbeat(self):
+        now = time.time()
+        with transaction(self.db, immediate=True):
+            self.db.execute(
+                "INSERT INTO replicas (replica_id, heartbeat, started_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(replica_id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                (self.replica_id, now, self.started_at),
+            )
+            self.db.execute("DELETE FROM replicas WHERE heartbeat < ?", (now - self.ttl,))
+            # Keep the leases we hold alive while their job runs
+            self.db.execute("UPDATE leases SET expires = ? WHERE owner = ? AND done = 0",
+                            (now + self.ttl, self.replica_id))
+            self.db.execute("DELETE FROM leases WHERE expires < ?", (now - LEASE_RETENTION,))
+            live = [r[0] for r in self.db.execute("SELECT replica_id FROM replicas ORDER BY replica_id")]
+
+        position = (live.index(self.replica_id), len(live))
+        if position != self.position:
+            print(f"🧭 Replica {self.replica_id} is now delivery shard {position[0] + 1}/{position[1]}")
+        self.position = position
+        return live
+
+    def shard(self):
+        return self.position
+
+    async def _beat(self):
+        while True:
+            try:
+                self.heartbeat()
+            except sqlite3.Error as e:
+                print(f"❌ Cluster heartbeat failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.heartbeat()
+        self.task = asyncio.create_task(self._beat())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        # Leave right away instead of waiting out the TTL; unfinished leases become free
+        self.db.execute("DELETE FROM replicas WHERE replica_id = ?", (self.replica_id,))
+        self.db.execute("UPDATE leases SET expires = 0 WHERE owner = ? AND done = 0", (self.replica_id,))
+        self.db.close()
+
+    # --- Leases ---
+    # Take `name` if it's free, expired, or already ours (and not finished)
+    def acquire(self, name):
+        now = time.time()
+        cur = self.db.execute(
+            "INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+            "WHERE leases.done = 0 AND (leases.expires < ? OR leases.owner = excluded.owner)",
+            (name, self.replica_id, now + self.ttl, now),
+        )
+        return cur.rowcount > 0
+
+    def finish(self, name):
+        self.db.execute("UPDATE leases SET done = 1 WHERE name = ? AND owner = ?", (name, self.replica_id))
+
+    # Hand an unfinished lease to whoever asks next
+    def release(self, name):
+        self.db.execute("UPDATE leases SET expires = 0 WHERE name = ? AND owner = ? AND done = 0",
+                        (name, self.replica_id))
+
+    def lease(self, name):
+        return self.db.execute("SELECT owner, expires, done FROM leases WHERE name = ?", (name,)).fetchone()
+
+    # Run job() on exactly one live replica; returns True if it ran here
+    async def exclusive(self, name, job, poll=1.0):
+        while True:
+            if self.acquire(name):
+                try:
+                    await job()
+                except BaseException:
+                    self.release(name)
+                    raise
+                self.finish(name)
+                return True
+            owner, expires, done = self.lease(name)
+            if done:
+                print(f"🧭 {name} handled by {owner}")
+                return False
+            await asyncio.sleep(min(poll, max(0.0, expires - time.time()) + 0.05))
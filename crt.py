@@ -0,0 +1,20 @@
+BULLISH = "🟢 Bullish CRT"
+BEARISH = "🔴 Bearish CRT"
+
+# --- CRT Signal Logic on candles.Candle (shared by both bots and the scan worker processes) ---
+# strict=False is onada.py's rule (no h1 > h2 / l1 < l2);
+# force='bullish'/'bearish' short-circuits the rule for TEST_MODE runs
+def check_crt(c1, c2, force=None, strict=True):
+    if force == 'bullish':
+        return BULLISH
+    elif force == 'bearish':
+        return BEARISH
+
+    l1, h1 = c1.l, c1.h
+    l2, h2, close2 = c2.l, c2.h, c2.c
+
+    if l1 > l2 and close2 > l1 and (h1 > h2 or not strict):
+        return BULLISH
+    elif h1 < h2 and close2 < h1 and (l1 < l2 or not strict):
+        return BEARISH
+    return None
@@ -0,0 +1,44 @@
+# --- Coalesce the signals of one candle close into a single digest per subscriber ---
+
+# Telegram counts message length in UTF-16 code units; Twilio WhatsApp bodies stop at 1600 characters
+TELEGRAM_MESSAGE_LIMIT = 4096
+WHATSAPP_MESSAGE_LIMIT = 1600
+
+def message_length(text):
+    return len(text.encode('utf-16-le')) // 2
+
+# One signal goes out as-is; several become a header plus one line each, split on line boundaries
+def format_digest(messages, limit=TELEGRAM_MESSAGE_LIMIT):
+    if len(messages) == 1:
+        return list(messages)
+    header = f"📊 {len(messages)} CRT signals"
+    # Leave room for the " (12/12)" part counter
+    budget = limit - message_length(header) - 12
+    parts = [[]]
+    size = 0
+    for line in messages:
+        length = message_length(line) + 1
+        if parts[-1] and size + length > budget:
+            parts.append([])
+            size = 0
+        parts[-1].append(line)
+        size += length
+    if len(parts) == 1:
+        return [header + "\n" + "\n".join(parts[0])]
+    return [f"{header} ({i}/{len(parts)})\n" + "\n".join(lines) for i, lines in enumerate(parts, 1)]
+
+# Signals wait here until the close that produced them has all its signals in
+class SignalCoalescer:
+    def __init__(self, flush):
+        # flush([(message, route, candle_time), ...]) publishes one batch
+        self.on_flush = flush
+        self.pending = []
+
+    def add(self, message, route=None, candle_time=None):
+        self.pending.append((message, route, candle_time))
+
+    # Called by the scan cycle and the stream detector once a close is fully evaluated
+    def flush(self):
+        batch, self.pending = self.pending, []
+        if batch:
+            self.on_flush(batch)
@@ -0,0 +1,158 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from aiohttp import web
+
+from resample import bucket_bounds, bucket_start
+from scanner import GRANULARITY_SECONDS
+
+def candle_time(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000000000Z")
+
+def parse_time(value):
+    return int(datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp())
+
+# OANDA-aligned candle open times in [start, stop)
+def candle_starts(granularity, start, stop):
+    seconds = GRANULARITY_SECONDS[granularity]
+    if seconds <= 3600:
+        return list(range(-(-start // seconds) * seconds, stop, seconds))
+    starts, _ = bucket_bounds(granularity, np.arange(start // 3600 * 3600, stop, 3600))
+    return [int(s) for s in np.unique(starts) if start <= s < stop]
+
+async def start_server(app, host='127.0.0.1', port=0):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, f"http://{host}:{runner.addresses[0][1]}"
+
+class FaultInjector:
+    def __init__(self, latency=0.0, error_rate=0.0, throttle_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rng = random.Random(seed)
+
+    async def delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def roll(self):
+        r = self.rng.random()
+        if r < self.throttle_rate:
+            return 'throttle'
+        if r < self.throttle_rate + self.error_rate:
+            return 'error'
+        return None
+
+# --- Fake OANDA v20 candles endpoint ---
+# Candles are a pure function of (instrument, granularity, start): even bars are a fixed
+# range, odd bars either sweep the previous bar's low (bullish CRT) or sit inside it.
+class FakeOanda:
+    def __init__(self, close, signal_rate=0.5, faults=None, rate_limit=0):
+        self.close = close
+        self.signal_rate = signal_rate
+        self.faults = faults or FaultInjector()
+        self.requests = 0
+        # Server-side limit like OANDA's: more than rate_limit requests in one second get 429 (0 = none)
+        self.rate_limit = rate_limit
+        self.window = (0, 0)
+        self.throttled = 0
+        self.app = web.Application()
+        self.app.router.add_get('/v3/instruments/{instrument}/candles', self.candles)
+
+    def candle(self, instrument, granularity, start, complete=True):
+        index = start // GRANULARITY_SECONDS[granularity]
+        if index % 2 == 0:
+            o, h, l, c = 100.0, 102.0, 98.0, 101.8
+        elif random.Random(f"{instrument}/{granularity}/{start}").random() < self.signal_rate:
+            o, h, l, c = 101.0, 101.5, 97.5, 99.0
+        else:
+            o, h, l, c = 100.0, 101.5, 98.5, 100.0
+        return {
+            'complete': complete,
+            'volume': 100,
+            'time': candle_time(start),
+            'mid': {'o': f"{o:.3f}", 'h': f"{h:.3f}", 'l': f"{l:.3f}", 'c': f"{c:.3f}"},
+        }
+
+    def over_limit(self):
+        second = int(time.monotonic())
+        count = self.window[1] + 1 if self.window[0] == second else 1
+        self.window = (second, count)
+        return bool(self.rate_limit) and count > self.rate_limit
+
+    async def candles(self, request):
+        self.requests += 1
+        if self.over_limit():
+            self.throttled += 1
+            return web.json_response({'errorMessage': 'Rate limit exceeded'}, status=429)
+        await self.faults.delay()
+        fault = self.faults.roll()
+        if fault == 'throttle':
+            return web.json_response({'errorMessage': 'Rate limit exceeded'}, status=429, headers={'Retry-After': '0.1'})
+        if fault == 'error':
+            return web.json_response({'errorMessage': 'Service unavailable'}, status=503)
+
+        instrument = request.match_info['instrument']
+        granularity = request.query.get('granularity', 'H1')
+        seconds = GRANULARITY_SECONDS[granularity]
+        count = int(request.query.get('count', 500))
+        # The bar containing `close` is the in-progress one
+        last = bucket_start(granularity, self.close)
+        if 'from' in request.query:
+            start = parse_time(request.query['from'])
+            if request.query.get('includeFirst', 'true') == 'false':
+                start += 1
+            if 'to' in request.query:
+                # from/to ranges are not capped by count
+                starts = candle_starts(granularity, start, min(parse_time(request.query['to']), last + 1))
+            else:
+                starts = candle_starts(granularity, start, last + 1)[:count]
+        else:
+            starts = candle_starts(granularity, last - count * seconds - 86400, last + 1)[-count:]
+
+        candles = [self.candle(instrument, granularity, s, complete=s < last) for s in starts]
+        return web.json_response({'instrument': instrument, 'granularity': granularity, 'candles': candles})
+
+# --- Fake Telegram Bot API (sendMessage only) ---
+class FakeTelegram:
+    def __init__(self, faults=None):
+        self.faults = faults or FaultInjector()
+        self.deliveries = []
+        self.requests = 0
+        self.app = web.Application()
+        self.app.router.add_post('/bot{token}/sendMessage', self.send_message)
+
+    async def send_message(self, request):
+        self.requests += 1
+        if request.content_type == 'application/json':
+            data = await request.json()
+        else:
+            data = dict(await request.post())
+        await self.faults.delay()
+
+        fault = self.faults.roll()
+        if fault == 'throttle':
+            return web.json_response({
+                'ok': False, 'error_code': 429,
+                'description': 'Too Many Requests: retry after 1',
+                'parameters': {'retry_after': 1},
+            }, status=429)
+        if fault == 'error':
+            return web.json_response({
+                'ok': False, 'error_code': 403,
+                'description': 'Forbidden: bot was blocked by the user',
+            }, status=403)
+
+        chat_id = int(data['chat_id'])
+        self.deliveries.append((chat_id, time.monotonic()))
+        return web.json_response({'ok': True, 'result': {
+            'message_id': len(self.deliveries),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': data.get('text', ''),
+        }})
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import time
+
+from metrics import OANDA_DEDUPED, OANDA_RATE_LIMIT
+
+# --- OANDA request governor: adaptive global rate limit, single-flight, short-lived cache ---
+# Every scan, sync and backfill request of a process goes through one governor. The rate starts at
+# OANDA_RATE requests/second, halves on 429/5xx and climbs back while responses are clean (0 = no limit).
+OANDA_RATE = float(os.getenv('OANDA_RATE', '100'))
+OANDA_MIN_RATE = float(os.getenv('OANDA_MIN_RATE', '5'))
+# Responses ending in the still-forming bar are reused for this long (never past the bar's close)
+OANDA_CACHE_TTL = float(os.getenv('OANDA_CACHE_TTL', '5'))
+# Share of the ceiling regained per second of clean responses after a cut
+RATE_RECOVERY = 0.05
+# Concurrent errors from one overload only cut the rate once
+CUT_INTERVAL = 1.0
+
+THROTTLE_STATUSES = {429, 500, 502, 503, 504}
+
+def request_key(instrument, params):
+    return instrument, tuple(sorted((k, str(v)) for k, v in params.items()))
+
+class RequestGovernor:
+    def __init__(self, rate=OANDA_RATE, min_rate=OANDA_MIN_RATE, cache_ttl=OANDA_CACHE_TTL):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.cut_at = 0.0
+        # Set from Retry-After - every request waits until then
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+        self.cache_ttl = cache_ttl
+        # key -> (expires, response); expires is wall-clock so it can line up with bar closes
+        self.cache = {}
+        # key -> task of the request already on the wire
+        self.inflight = {}
+        OANDA_RATE_LIMIT.set(rate)
+
+    # --- Adaptive token bucket ---
+    async def acquire(self):
+        if self.max_rate <= 0:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if self.paused_until > now:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                # Burst of at most one second's worth at the current rate
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    # Feed back the status of every attempt (None = transport error, which says nothing about load)
+    def observe(self, status, retry_after=None):
+        if self.max_rate <= 0 or status is None:
+            return
+        now = time.monotonic()
+        if status in THROTTLE_STATUSES:
+            if retry_after:
+                try:
+                    self.paused_until = max(self.paused_until, now + float(retry_after))
+                except ValueError:
+                    pass
+            if now - self.cut_at >= CUT_INTERVAL:
+                self.cut_at = now
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.tokens = min(self.tokens, 0.0)
+                OANDA_RATE_LIMIT.set(self.rate)
+                print(f"🐢 OANDA answered {status}, slowing to {self.rate:.1f} requests/s")
+        elif status == 200 and self.rate < self.max_rate:
+            # +RATE_RECOVERY of the ceiling per second at the current rate
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_RECOVERY / self.rate)
+            OANDA_RATE_LIMIT.set(self.rate)
+
+    # --- Single-flight + cache ---
+    # call() does the actual request; cache_until(response) -> wall-clock expiry, or None to not cache
+    async def request(self, key, call, cache_until=None):
+        if self.cache_ttl > 0:
+            entry = self.cache.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    OANDA_DEDUPED.inc(reason='cache')
+                    return entry[1]
+                del self.cache[key]
+
+        task = self.inflight.get(key)
+        if task is None:
+            task = self.inflight[key] = asyncio.ensure_future(self._fetch(key, call, cache_until))
+        else:
+            OANDA_DEDUPED.inc(reason='inflight')
+        # One caller giving up doesn't cancel the request for the others
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, call, cache_until):
+        try:
+            response = await call()
+        finally:
+            del self.inflight[key]
+        if self.cache_ttl > 0 and cache_until is not None:
+            now = time.time()
+            expires = cache_until(response)
+            if expires is not None and expires > now:
+                self._prune(now)
+                self.cache[key] = (min(expires, now + self.cache_ttl), response)
+        return response
+
+    def _prune(self, now):
+        for key in [k for k, (expires, _) in self.cache.items() if expires <= now]:
+            del self.cache[key]
@@ -0,0 +1,145 @@
+import threading
+import time
+from bisect import bisect_left
+
+# --- Minimal Prometheus text-format metrics (thread-safe, no extra dependency) ---
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+_lock = threading.Lock()
+
+def _label_str(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(n, '') for n in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_label_str(self.label_names, key)} {value}")
+        return lines
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with _lock:
+            self.values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = self.header()
+        for key, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                labels = _label_str(self.label_names + ('le',), key + (repr(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_str(self.label_names + ('le',), key + ('+Inf',))
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_label_str(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_label_str(self.label_names, key)} {count}")
+        return lines
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+def render():
+    with _lock:
+        lines = []
+        for metric in _registry:
+            lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+# --- /metrics HTTP endpoint for the asyncio bot (onada.py serves it through Flask) ---
+async def serve_metrics(port, host='0.0.0.0'):
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(body=render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+def signal_direction(result):
+    return 'bullish' if 'Bullish' in result else 'bearish'
+
+# --- Bot metrics ---
+OANDA_FETCH_SECONDS = Histogram('crt_oanda_fetch_seconds', 'OANDA candles request latency')
+OANDA_RETRIES = Counter('crt_oanda_retries_total', 'OANDA candles requests retried')
+OANDA_RATE_LIMIT = Gauge('crt_oanda_rate_limit', 'Current adaptive OANDA request rate (requests/second)')
+OANDA_DEDUPED = Counter('crt_oanda_deduped_total', 'OANDA candles requests answered without a call',
+                        labels=('reason',))
+CRT_EVAL_SECONDS = Histogram('crt_eval_seconds', 'Time spent in check_crt',
+                             buckets=(1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3))
+SCAN_CYCLE_SECONDS = Histogram('crt_scan_cycle_seconds', 'Wall-clock time of one watchlist scan')
+SCHEDULER_DRIFT_SECONDS = Histogram('crt_scheduler_drift_seconds', 'Wake-up delay after the true candle close')
+SIGNALS = Counter('crt_signals_total', 'CRT signals detected', labels=('granularity', 'direction'))
+SEND_SECONDS = Histogram('crt_send_seconds', 'Per-message delivery time', labels=('channel',))
+BROADCAST_SECONDS = Histogram('crt_broadcast_seconds', 'Time to deliver one alert to every subscriber',
+                              labels=('channel',))
+SEND_FAILURES = Counter('crt_send_failures_total', 'Messages that could not be delivered', labels=('channel',))
+SEND_RETRIES = Counter('crt_send_retries_total', 'Message sends retried after rate limiting', labels=('channel',))
+SUBSCRIBERS = Gauge('crt_subscribers', 'Current number of subscribers', labels=('channel',))
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import random
+import threading
+
+import aiohttp
+
+from broadcast import Broadcaster, RateLimited, channel_name
+
+TWILIO_API = os.getenv('TWILIO_API_URL', 'https://api.twilio.com')
+# Twilio's default WhatsApp throughput is ~80 messages/second per sender
+TWILIO_RATE = float(os.getenv('TWILIO_RATE', '20'))
+TWILIO_PER_CHAT_RATE = float(os.getenv('TWILIO_PER_CHAT_RATE', '1'))
+TWILIO_POOL_SIZE = int(os.getenv('TWILIO_POOL_SIZE', '16'))
+# Comma-separated whatsapp:+<number> list (falls back to the single TO_WHATSAPP_NUMBER)
+WHATSAPP_RECIPIENTS = [r.strip() for r in
+                       os.getenv('WHATSAPP_RECIPIENTS', os.getenv('TO_WHATSAPP_NUMBER') or '').split(',') if r.strip()]
+
+RETRY_STATUSES = {500, 502, 503, 504}
+# Invalid 'To' number, recipient opted out, not a WhatsApp number
+UNREACHABLE_CODES = {21211, 21610, 63003}
+
+class TwilioError(Exception):
+    def __init__(self, status, code, message):
+        super().__init__(f"Twilio {status} ({code}): {message}")
+        self.status = status
+        self.code = code
+        self.unreachable = code in UNREACHABLE_CODES
+
+# --- Twilio WhatsApp over a pooled aiohttp session, shaped like telegram.Bot.send_message ---
+class TwilioWhatsApp:
+    def __init__(self, account_sid, auth_token, from_number, base_url=None, max_connections=TWILIO_POOL_SIZE,
+                 timeout=10.0, max_retries=3, backoff=0.5):
+        self.url = f"{(base_url or TWILIO_API).rstrip('/')}/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self.auth = aiohttp.BasicAuth(account_sid or '', auth_token or '')
+        self.from_number = from_number
+        self.max_connections = max_connections
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = None
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout, auth=self.auth)
+        return self.session
+
+    # parse_mode is Telegram-only and ignored here
+    async def send_message(self, chat_id, text, parse_mode=None):
+        data = {'From': self.from_number, 'To': chat_id, 'Body': text}
+        attempt = 0
+        while True:
+            try:
+                async with self._get_session().post(self.url, data=data) as resp:
+                    if resp.status in (200, 201):
+                        return await resp.json(content_type=None)
+                    body = await resp.json(content_type=None)
+                    if resp.status == 429:
+                        raise RateLimited(float(resp.headers.get('Retry-After', 1)), "Twilio rate limit")
+                    if resp.status not in RETRY_STATUSES or attempt >= self.max_retries:
+                        raise TwilioError(resp.status, body.get('code'), body.get('message'))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    raise TwilioError(None, None, repr(e)) from e
+            await asyncio.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+            attempt += 1
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+def whatsapp_from_env(base_url=None):
+    sid = os.getenv('TWILIO_ACCOUNT_SID')
+    sender = os.getenv('TWILIO_WHATSAPP_NUMBER')
+    if not sid or not sender:
+        return None
+    return TwilioWhatsApp(sid, os.getenv('TWILIO_AUTH_TOKEN'), sender, base_url)
+
+# --- Every channel sends concurrently; detection never waits on delivery ---
+class Notifier:
+    def __init__(self):
+        self.channels = {}
+        self.tasks = set()
+
+    # recipients: callable returning a fresh iterable of chat ids / numbers per alert
+    def add_channel(self, name, sender, recipients, concurrency=8, rate=TWILIO_RATE, per_chat_rate=TWILIO_PER_CHAT_RATE,
+                    parse_mode=None):
+        broadcaster = Broadcaster(sender, concurrency, rate, per_chat_rate, channel=name)
+        self.channels[name] = (broadcaster, recipients, parse_mode)
+        return broadcaster
+
+    async def notify(self, text):
+        names = list(self.channels)
+        results = await asyncio.gather(*(self._send(name, text) for name in names), return_exceptions=True)
+        return dict(zip(names, results))
+
+    async def _send(self, name, text):
+        broadcaster, recipients, parse_mode = self.channels[name]
+        stats = await broadcaster.broadcast(recipients(), text, parse_mode=parse_mode)
+        for recipient, error in stats['failures']:
+            print(f"❌ Failed to send {channel_name(name)} to {recipient}: {error}")
+        print(f"📤 {channel_name(name)} sent to {stats['sent']} recipient(s) "
+              f"(Failed: {stats['failed']}, p99: {stats['p99']*1000:.0f}ms): {text}")
+        return stats
+
+    # Fire-and-forget from the event loop
+    def notify_soon(self, text):
+        task = asyncio.create_task(self.notify(text))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def close(self):
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        for broadcaster, _, _ in self.channels.values():
+            if isinstance(broadcaster.bot, TwilioWhatsApp):
+                await broadcaster.bot.close()
+
+# --- Notifier on its own event loop thread, for synchronous callers (onada.py's polling thread) ---
+class BackgroundNotifier:
+    def __init__(self, notifier):
+        self.notifier = notifier
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='notifier', daemon=True)
+        self.thread.start()
+
+    # Returns immediately with a concurrent.futures.Future
+    def submit(self, text):
+        return asyncio.run_coroutine_threadsafe(self.notifier.notify(text), self.loop)
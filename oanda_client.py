@@ -0,0 +1,160 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from candles import loads
+from governor import OANDA_CACHE_TTL, OANDA_RATE, RequestGovernor, request_key
+from metrics import OANDA_FETCH_SECONDS, OANDA_RETRIES
+from tracing import span, tracer
+
+OANDA_HOSTS = {
+    'practice': 'https://api-fxpractice.oanda.com',
+    'live': 'https://api-fxtrade.oanda.com',
+}
+
+# Retry on throttling and transient server errors only
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def parse_candle_time(value):
+    # OANDA RFC3339 times carry nanoseconds, e.g. 2024-01-02T03:00:00.000000000Z
+    parsed = datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+    fraction = value[20:].rstrip('Z')
+    if fraction:
+        parsed += timedelta(microseconds=int(fraction[:6].ljust(6, '0')))
+    return parsed
+
+# Wall-clock end of the still-forming last bar (the only part of a response worth caching), or None
+def incomplete_bar_end(response, granularity):
+    from scanner import GRANULARITY_SECONDS
+    candles = response.get('candles')
+    if not candles or candles[-1].get('complete', True) or granularity not in GRANULARITY_SECONDS:
+        return None
+    return parse_candle_time(candles[-1]['time']).timestamp() + GRANULARITY_SECONDS[granularity]
+
+class CandleFetchError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"OANDA {status}: {message}")
+        self.status = status
+
+# --- Async OANDA candles client (keep-alive pool, timeouts, retry/backoff, request governor) ---
+class AsyncCandleClient:
+    def __init__(self, access_token, environment='practice', base_url=None,
+                 max_connections=20, timeout=10.0, max_retries=3, backoff=0.5, rate=OANDA_RATE,
+                 cache_ttl=OANDA_CACHE_TTL):
+        self.access_token = access_token
+        self.base_url = (base_url or OANDA_HOSTS[environment]).rstrip('/')
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.headers = {
+            'Authorization': f'Bearer {access_token}',
+            'Accept-Datetime-Format': 'RFC3339',
+        }
+        self.session = None
+        # Shared by everything using this client: rate limit, identical requests coalesced
+        self.governor = RequestGovernor(rate, cache_ttl=cache_ttl)
+
+    def _get_session(self):
+        # aiohttp is imported on first use; it is the slowest import in the bot
+        import aiohttp
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=self.headers,
+            )
+        return self.session
+
+    # One GET -> (status, body, Retry-After); transport failures raise CandleFetchError(None, ...)
+    async def _get(self, url, params):
+        import aiohttp
+        try:
+            async with self._get_session().get(url, params=params) as resp:
+                return resp.status, await resp.read(), resp.headers.get('Retry-After')
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise CandleFetchError(None, repr(e)) from e
+
+    def _retry_delay(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    # Same response shape as InstrumentsCandles(...).response
+    async def candles(self, instrument, params):
+        granularity = params.get('granularity')
+        with span('oanda.request', instrument=instrument, granularity=granularity):
+            return await self.governor.request(
+                request_key(instrument, params),
+                lambda: self._timed_candles(instrument, params),
+                lambda response: incomplete_bar_end(response, granularity),
+            )
+
+    async def _timed_candles(self, instrument, params):
+        started = time.perf_counter()
+        try:
+            return await self._candles(instrument, params)
+        finally:
+            OANDA_FETCH_SECONDS.observe(time.perf_counter() - started)
+
+    async def _candles(self, instrument, params):
+        url = f"{self.base_url}/v3/instruments/{instrument}/candles"
+        attempt = 0
+
+        while True:
+            retry_after = None
+            await self.governor.acquire()
+            try:
+                status, body, retry_after = await self._get(url, params)
+            except CandleFetchError:
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                self.governor.observe(status, retry_after)
+                if status == 200:
+                    return loads(body)
+                if status not in RETRY_STATUSES or attempt >= self.max_retries:
+                    raise CandleFetchError(status, body.decode(errors='replace'))
+
+            delay = self._retry_delay(attempt, retry_after)
+            attempt += 1
+            OANDA_RETRIES.inc()
+            tracer.event('oanda.backoff', 0.0, instrument=instrument, delay=round(delay, 3), attempt=attempt)
+            print(f"🔁 Retrying {instrument} candles in {delay:.2f}s (attempt {attempt}/{self.max_retries})")
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+# --- Stdlib transport for one-shot runs: no aiohttp import, one thread per connection ---
+class ThreadedCandleClient(AsyncCandleClient):
+    executor = None
+
+    def _fetch(self, url, params):
+        request = Request(f"{url}?{urlencode(params)}", headers=self.headers)
+        try:
+            with urlopen(request, timeout=self.timeout) as resp:
+                return resp.status, resp.read(), None
+        except HTTPError as e:
+            return e.code, e.read(), e.headers.get('Retry-After')
+        except OSError as e:
+            raise CandleFetchError(None, repr(e)) from e
+
+    async def _get(self, url, params):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.max_connections)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._fetch, url, params)
+
+    async def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
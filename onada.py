@@ -3,95 +3,103 @@ import time
 import threading
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from flask import Flask, jsonify
+from flask import Flask, jsonify, Response
 from dotenv import load_dotenv
 
 import oandapyV20
 from oandapyV20.endpoints.instruments import InstrumentsCandles
-from twilio.rest import Client
+from telegram import Bot
 
-# Load environment variables
+# Load environment variables (before the modules below read their configuration)
 load_dotenv()
 
+import metrics
+from broadcast import TELEGRAM_GLOBAL_RATE, TELEGRAM_PER_CHAT_RATE
+from candles import CandleBatch
+from crt import check_crt as crt_rule
+from notifier import TWILIO_POOL_SIZE, WHATSAPP_RECIPIENTS, BackgroundNotifier, Notifier, whatsapp_from_env
+from resample import resample
+from tracing import span, trace, tracer
+from metrics import CRT_EVAL_SECONDS, OANDA_FETCH_SECONDS, SCHEDULER_DRIFT_SECONDS, SIGNALS, SUBSCRIBERS, signal_direction
+
 # API Tokens and setup
 ACCESS_TOKEN = os.getenv('OANDA_ACCESS_TOKEN')
-TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
-TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
-TWILIO_WHATSAPP_NUMBER = os.getenv('TWILIO_WHATSAPP_NUMBER')
-TO_WHATSAPP_NUMBER = os.getenv('TO_WHATSAPP_NUMBER')
+TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+# onada's looser rule never reaches app.py's subscribers - Telegram is opt-in with its own chat list
+ONADA_TELEGRAM_CHATS = [int(c) for c in os.getenv('ONADA_TELEGRAM_CHATS', '').split(',') if c.strip()]
 
 client = oandapyV20.API(access_token=ACCESS_TOKEN)
-twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
 
 # Flask app
 app = Flask(__name__)
 bot_running = False  # Flag to show bot status
 
-# --- WhatsApp Messaging ---
-def send_whatsapp_message(body):
-    try:
-        twilio_client.messages.create(
-            body=body,
-            from_=TWILIO_WHATSAPP_NUMBER,
-            to=TO_WHATSAPP_NUMBER
-        )
-        print(f"📤 WhatsApp sent: {body}")
-    except Exception as e:
-        print(f"❌ Failed to send WhatsApp message: {e}")
-
-# --- CRT Logic ---
+# --- Notifications: WhatsApp (Twilio) and, when configured, Telegram chats ---
+notifier = Notifier()
+whatsapp = whatsapp_from_env()
+if whatsapp and WHATSAPP_RECIPIENTS:
+    notifier.add_channel('whatsapp', whatsapp, lambda: WHATSAPP_RECIPIENTS, concurrency=TWILIO_POOL_SIZE)
+if TELEGRAM_BOT_TOKEN and ONADA_TELEGRAM_CHATS:
+    notifier.add_channel('telegram', Bot(TELEGRAM_BOT_TOKEN), lambda: ONADA_TELEGRAM_CHATS, rate=TELEGRAM_GLOBAL_RATE,
+                         per_chat_rate=TELEGRAM_PER_CHAT_RATE, parse_mode='Markdown')
+# Sends run on the notifier's own loop, so the polling thread never waits on them
+background_notifier = BackgroundNotifier(notifier)
+
+def send_alert(body):
+    background_notifier.submit(body)
+
+# --- CRT Logic (no h1 > h2 / l1 < l2 condition, unlike app.py) ---
 def check_crt(c1, c2):
-    l1, h1, close1 = float(c1['l']), float(c1['h']), float(c1['c'])
-    l2, h2, close2 = float(c2['l']), float(c2['h']), float(c2['c'])
-
-    if l1 > l2 and close2 > l1:
-        return "🟢 Bullish CRT"
-    elif h1 < h2 and close2 < h1:
-        return "🔴 Bearish CRT"
-    return None
+    return crt_rule(c1, c2, strict=False)
 
-def fetch_candles(granularity):
+# One H1 request feeds every timeframe; H4 candles are built locally from it
+def fetch_candles(granularities):
     params = {
-        "granularity": granularity,
-        "count": 3,
+        "granularity": "H1",
+        "count": 16,
         "price": "M"
     }
     request = InstrumentsCandles(instrument="XAU_USD", params=params)
-    client.request(request)
-    candles = request.response['candles']
-
-    if len(candles) < 3:
-        print("⚠️ Not enough candle data.")
-        return
-
-    c1 = candles[-3]['mid']
-    c2 = candles[-2]['mid']
-    print(c1, c2)
-    result = check_crt(c1, c2)
-    print(result)
-    if result:
-        msg = f"[{granularity}] {result}"
-        send_whatsapp_message(msg)
+    with OANDA_FETCH_SECONDS.time(), span('oanda.request', instrument="XAU_USD", granularity="H1"):
+        client.request(request)
+    with span('parse', candles=len(request.response['candles'])):
+        h1 = CandleBatch.from_oanda(request.response['candles'])
+
+    for granularity in granularities:
+        candles = h1 if granularity == "H1" else resample(h1, granularity, "H1")
+        if len(candles) < 2:
+            print(f"⚠️ Not enough {granularity} candle data.")
+            continue
+
+        c1, c2 = candles[-2], candles[-1]
+        with CRT_EVAL_SECONDS.time(), span('check_crt', instrument="XAU_USD", granularity=granularity):
+            result = check_crt(c1, c2)
+        if result:
+            SIGNALS.inc(granularity=granularity, direction=signal_direction(result))
+            msg = f"[{granularity}] {result}"
+            send_alert(msg)
 
 # --- Background CRT Bot ---
 def run_crt_bot():
     global bot_running
     bot_running = True
+    SUBSCRIBERS.set(len(WHATSAPP_RECIPIENTS) if 'whatsapp' in notifier.channels else 0, channel='whatsapp')
+    SUBSCRIBERS.set(len(ONADA_TELEGRAM_CHATS) if 'telegram' in notifier.channels else 0, channel='telegram')
     print("🚀 CRT Bot started... Waiting for H1/H4 candle closes...")
 
     while True:
         now = datetime.now(ZoneInfo("Asia/Kolkata"))
         minute = now.minute
         second = now.second
-        print(f"🕒 {minute}:{second}")
 
         if minute == 30 and 0 <= second <= 2:
-            if now.hour % 1 == 0:
-                print("🔍 Fetching H1 candles...")
-                fetch_candles("H1")
-            if now.hour % 4 == 0:
-                print("🔍 Fetching H4 candles...")
-                fetch_candles("H4")
+            drift = second + now.microsecond / 1e6
+            SCHEDULER_DRIFT_SECONDS.observe(drift)
+            granularities = ["H1"] + (["H4"] if now.hour % 4 == 0 else [])
+            print(f"🔍 Fetching {'/'.join(granularities)} candles...")
+            with trace('cycle', granularities='/'.join(granularities)):
+                tracer.event('schedule.wake', drift)
+                fetch_candles(granularities)
 
         time.sleep(1)
 
@@ -106,6 +114,10 @@ def home():
 def ping():
     return "pong"
 
+@app.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), headers={'Content-Type': metrics.CONTENT_TYPE})
+
 # --- Start everything ---
 if __name__ == "__main__":
     # Start CRT bot in background
@@ -0,0 +1,149 @@
+import time
+
+STARTED = time.perf_counter()
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+# --- One-shot mode for cron / function runtimes: scan the candle that just closed, deliver, exit ---
+# */5 * * * *  cd /opt/crtbot && python once.py
+# Only what the scan needs is imported up front; the subscriber DB, the outbox and the Telegram client
+# are opened after the scan, and only when there is something to deliver.
+
+# A run this long after the last close has nothing new to scan (cron misfire, market closed)
+ONCE_MAX_LAG = float(os.getenv('ONCE_MAX_LAG', '900'))
+# Deliveries still pending after this stay in the outbox for the next run
+ONCE_DELIVERY_TIMEOUT = float(os.getenv('ONCE_DELIVERY_TIMEOUT', '120'))
+
+def elapsed_ms():
+    return (time.perf_counter() - STARTED) * 1000
+
+def load_config():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+# Latest close at or before `now`, with the timeframes that closed then
+def last_close(scheduler, now):
+    from scanner import GRANULARITY_SECONDS
+    t = now - timedelta(seconds=max(GRANULARITY_SECONDS[g] for g in scheduler.granularities) + 1)
+    latest = None
+    while True:
+        close, due = scheduler.next_fire(t)
+        if close > now:
+            return latest
+        latest = (close, due)
+        t = close
+
+def open_outbox():
+    from outbox import Outbox
+    from subscribers import SubscriberStore
+    subscribers = SubscriberStore()
+    if subscribers.is_empty():
+        migrated = subscribers.migrate_from_json("users.json")
+        if migrated:
+            print(f"📦 Migrated {migrated} subscribers from users.json")
+    return subscribers, Outbox(subscribers.path)
+
+async def deliver(subscribers, outbox, signals, close):
+    from digest import format_digest
+    from metrics import signal_direction
+    from resample import bucket_start
+    # Messages not already sent for the same candle (earlier runs for this close)
+    messages = []
+    if signals:
+        candle_end = int(close.timestamp()) - 1
+        batch = [(msg, (instrument, granularity, signal_direction(msg)), bucket_start(granularity, candle_end))
+                 for instrument, granularity, msg in signals]
+        fresh, queued = outbox.enqueue_digest(batch, format_digest)
+        messages = [msg for msg, _, _ in fresh]
+        if queued:
+            print(f"📬 Queued {len(fresh)} signal(s) as {len(queued)} message(s), "
+                  f"{sum(fanout for _, fanout in queued)} deliveries")
+
+    pending = outbox.depth()
+    token = os.getenv('TELEGRAM_BOT_TOKEN')
+    if pending and token and token != "YOUR_BOT_TOKEN_HERE":
+        from broadcast import Broadcaster
+        from outbox import DeliveryWorkers
+        from telegram import Bot
+        from telegram.request import HTTPXRequest
+        pool = int(os.getenv('TELEGRAM_POOL_SIZE', '64'))
+        request = HTTPXRequest(connection_pool_size=pool, pool_timeout=30.0)
+        workers = DeliveryWorkers(outbox, Broadcaster(Bot(token, request=request), concurrency=pool), subscribers)
+        workers.start()
+        try:
+            await asyncio.wait_for(outbox.join(), ONCE_DELIVERY_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"⏳ {outbox.depth()} deliveries still pending, leaving them for the next run")
+        finally:
+            await workers.stop()
+            await request.shutdown()
+    elif pending:
+        print(f"⚠️ TELEGRAM_BOT_TOKEN not configured, {pending} deliveries left in the outbox")
+
+    # WhatsApp has no outbox; only this run's new signals go out
+    if messages:
+        from digest import WHATSAPP_MESSAGE_LIMIT
+        from notifier import TWILIO_POOL_SIZE, WHATSAPP_RECIPIENTS, Notifier, whatsapp_from_env
+        whatsapp = whatsapp_from_env()
+        if whatsapp and WHATSAPP_RECIPIENTS:
+            notifier = Notifier()
+            notifier.add_channel('whatsapp', whatsapp, lambda: WHATSAPP_RECIPIENTS, concurrency=TWILIO_POOL_SIZE)
+            try:
+                for part in format_digest(messages, WHATSAPP_MESSAGE_LIMIT):
+                    await notifier.notify(part)
+            finally:
+                await notifier.close()
+
+async def run_once(now=None):
+    load_config()
+    from crt import check_crt
+    from oanda_client import ThreadedCandleClient
+    from scanner import GRANULARITIES, WATCHLIST, fetch_signal, scan_cycle, watchlist_pairs
+    from scheduler import CandleCloseScheduler
+
+    test_mode = os.getenv('TEST_MODE', 'false').lower() == 'true' or '--test' in sys.argv
+    force = os.getenv('FORCE_CRT_SIGNAL', 'none').lower() if test_mode else None
+    now = now or datetime.now(timezone.utc)
+    latest = last_close(CandleCloseScheduler(GRANULARITIES, respect_market_hours=not test_mode), now)
+    if latest is None or (now - latest[0]).total_seconds() > ONCE_MAX_LAG:
+        print(f"💤 No {'/'.join(GRANULARITIES)} candle closed in the last {ONCE_MAX_LAG:.0f}s, nothing to scan")
+        return 0
+    close, granularities = latest
+
+    client = ThreadedCandleClient(
+        os.getenv('OANDA_ACCESS_TOKEN'),
+        environment="practice",
+        max_connections=int(os.getenv('OANDA_MAX_CONNECTIONS', '20')),
+        timeout=float(os.getenv('OANDA_TIMEOUT', '10')),
+        max_retries=int(os.getenv('OANDA_MAX_RETRIES', '3'))
+    )
+
+    async def scan_one(instrument, granularity):
+        return await fetch_signal(client, instrument, granularity, lambda c1, c2: check_crt(c1, c2, force=force),
+                                  close, verbose=test_mode)
+
+    print(f"⏱️ Ready to scan {'/'.join(granularities)} close at {close:%Y-%m-%d %H:%M} UTC "
+          f"for {len(WATCHLIST)} instrument(s) after {elapsed_ms():.0f}ms")
+    try:
+        signals, scan_elapsed = await scan_cycle(scan_one, watchlist_pairs(granularities),
+                                                 concurrency=client.max_connections)
+    finally:
+        await client.close()
+    if not signals:
+        print("ℹ️ No CRT signal detected")
+    for _, _, msg in signals:
+        print(msg)
+
+    subscribers, outbox = open_outbox()
+    try:
+        await deliver(subscribers, outbox, signals, close)
+    finally:
+        subscribers.close()
+    print(f"✅ Done in {elapsed_ms():.0f}ms (scan {scan_elapsed*1000:.0f}ms)")
+    return len(signals)
+
+if __name__ == "__main__":
+    asyncio.run(run_once())
@@ -0,0 +1,245 @@
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from backtest import crt_masks, load_csv
+from candle_store import CANDLE_STORE_DIR, CandleStore
+
+# --- Parallel parameter sweep over CRT rule variants ---
+# python optimize.py --granularities H1,H4 --min-sweep 0:0.5:11 --min-body 0:0.6:7 --workers 8
+
+# Sessions by the UTC hour the sweep candle opens in (start inclusive, end exclusive, may wrap midnight)
+SESSIONS = {
+    'all': None,
+    'asia': (23, 8),
+    'london': (7, 16),
+    'newyork': (12, 21),
+    'overlap': (12, 16),
+}
+
+RESULT_COLUMNS = ['rank', 'rule', 'min_sweep', 'min_body', 'session', 'horizon', 'trades', 'bullish', 'bearish',
+                  'hit_rate', 'expectancy', 'avg_win', 'avg_loss', 'datasets']
+
+# "0,0.1,0.2" or "start:stop:num" (inclusive, like np.linspace)
+def parse_values(text, cast=float):
+    if ':' in text:
+        start, stop, num = text.split(':')
+        return [cast(round(float(v), 6)) for v in np.linspace(float(start), float(stop), int(num))]
+    return [cast(v) for v in text.split(',') if v.strip()]
+
+def variant_grid(rules, min_sweeps, min_bodies, sessions, horizons):
+    return [
+        {'rule': rule, 'min_sweep': sweep, 'min_body': body, 'session': session, 'horizon': horizon}
+        for rule, sweep, body, session, horizon in itertools.product(rules, min_sweeps, min_bodies, sessions, horizons)
+    ]
+
+def store_datasets(root, instruments=None, granularities=None):
+    datasets = []
+    if not os.path.isdir(root):
+        return datasets
+    for instrument in sorted(os.listdir(root)):
+        if instruments and instrument not in instruments:
+            continue
+        for granularity in sorted(os.listdir(os.path.join(root, instrument))):
+            if granularities and granularity not in granularities:
+                continue
+            if os.path.exists(os.path.join(root, instrument, granularity, 'time.bin')):
+                datasets.append(('store', instrument, granularity, root))
+    return datasets
+
+def dataset_name(spec):
+    if spec[0] == 'store':
+        return f"{spec[1]}/{spec[2]}"
+    return os.path.basename(spec[1])
+
+def load_dataset(spec):
+    if spec[0] == 'store':
+        _, instrument, granularity, root = spec
+        # Read-only memmaps: every worker shares the same page-cache pages
+        return CandleStore(instrument, granularity, root).arrays()
+    return load_csv(spec[1])
+
+# --- Per-dataset features, computed once per worker and reused by every variant ---
+def candle_features(arrays, horizons):
+    o, h, l, c = arrays['o'], arrays['h'], arrays['l'], arrays['c']
+    h1, l1 = h[:-1], l[:-1]
+    o2, h2, l2, c2 = o[1:], h[1:], l[1:], c[1:]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        range1 = h1 - l1
+        range2 = h2 - l2
+        features = {
+            # How far c2 ran past c1's extreme, as a fraction of c1's range
+            'bull_sweep': np.where(range1 > 0, (l1 - l2) / range1, 0.0),
+            'bear_sweep': np.where(range1 > 0, (h2 - h1) / range1, 0.0),
+            'body': np.where(range2 > 0, np.abs(c2 - o2) / range2, 0.0),
+            'hour': (np.asarray(arrays['time'][1:]) // 3600) % 24,
+            'sessions': {},
+            'forward': {},
+        }
+    for rule, strict in (('strict', True), ('loose', False)):
+        bullish, bearish = crt_masks(h, l, c, strict)
+        features[rule] = (bullish, bearish)
+
+    # Forward return from the sweep candle's close; NaN where the horizon runs past the data
+    close = np.asarray(c, dtype=np.float64)
+    for horizon in horizons:
+        forward = np.full(len(close) - 1, np.nan)
+        if horizon < len(close) - 1:
+            entry = close[1:len(close) - horizon]
+            forward[:len(entry)] = (close[1 + horizon:] - entry) / entry
+        features['forward'][horizon] = forward
+    return features
+
+def session_mask(hour, session):
+    window = SESSIONS[session]
+    if window is None:
+        return np.ones(len(hour), dtype=bool)
+    start, end = window
+    if start < end:
+        return (hour >= start) & (hour < end)
+    return (hour >= start) | (hour < end)
+
+def evaluate_variant(features, variant):
+    bullish, bearish = features[variant['rule']]
+    body_ok = features['body'] >= variant['min_body']
+    sessions = features['sessions']
+    if variant['session'] not in sessions:
+        sessions[variant['session']] = session_mask(features['hour'], variant['session'])
+    in_session = sessions[variant['session']]
+
+    bullish = bullish & (features['bull_sweep'] >= variant['min_sweep']) & body_ok & in_session
+    # crt_masks already gives bullish precedence like check_crt, so a bar the bullish filters reject is no trade
+    bearish = bearish & (features['bear_sweep'] >= variant['min_sweep']) & body_ok & in_session
+
+    forward = features['forward'][variant['horizon']]
+    returns = np.concatenate((forward[bullish], -forward[bearish]))
+    returns = returns[~np.isnan(returns)]
+    wins = returns[returns > 0]
+    losses = returns[returns <= 0]
+    return {
+        'trades': int(len(returns)),
+        'bullish': int(bullish.sum()),
+        'bearish': int(bearish.sum()),
+        'wins': int(len(wins)),
+        'win_sum': float(wins.sum()),
+        'loss_sum': float(losses.sum()),
+    }
+
+_features = {}
+
+def _evaluate_chunk(spec, horizons, variants):
+    if spec not in _features:
+        _features.clear()
+        _features[spec] = candle_features(load_dataset(spec), horizons)
+    features = _features[spec]
+    return [(i, evaluate_variant(features, v)) for i, v in variants]
+
+# --- Pool the per-dataset tallies into one row per variant and rank ---
+def rank_results(variants, totals, min_trades=30):
+    rows = []
+    for i, variant in enumerate(variants):
+        t = totals[i]
+        trades = t['trades']
+        if trades < min_trades:
+            continue
+        losses = trades - t['wins']
+        rows.append({
+            **variant,
+            'trades': trades,
+            'bullish': t['bullish'],
+            'bearish': t['bearish'],
+            'hit_rate': t['wins'] / trades,
+            # Mean forward return per trade = hit_rate * avg_win + (1 - hit_rate) * avg_loss
+            'expectancy': (t['win_sum'] + t['loss_sum']) / trades,
+            'avg_win': t['win_sum'] / t['wins'] if t['wins'] else 0.0,
+            'avg_loss': t['loss_sum'] / losses if losses else 0.0,
+            'datasets': t['datasets'],
+        })
+    rows.sort(key=lambda r: (r['expectancy'], r['hit_rate']), reverse=True)
+    for rank, row in enumerate(rows, 1):
+        row['rank'] = rank
+    return rows
+
+def run_sweep(datasets, variants, workers=None, chunks_per_dataset=None):
+    workers = workers or os.cpu_count() or 1
+    horizons = sorted({v['horizon'] for v in variants})
+    indexed = list(enumerate(variants))
+    # Enough chunks to keep every worker busy, few enough that feature reuse stays high
+    chunks = chunks_per_dataset or max(1, min(len(indexed), -(-workers * 2 // max(1, len(datasets)))))
+    size = -(-len(indexed) // chunks)
+
+    totals = [{'trades': 0, 'bullish': 0, 'bearish': 0, 'wins': 0, 'win_sum': 0.0, 'loss_sum': 0.0, 'datasets': 0}
+              for _ in variants]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_evaluate_chunk, spec, horizons, indexed[start:start + size])
+                   for spec in datasets for start in range(0, len(indexed), size)]
+        for future in as_completed(futures):
+            for i, tally in future.result():
+                total = totals[i]
+                for key, value in tally.items():
+                    total[key] += value
+                if tally['trades']:
+                    total['datasets'] += 1
+    return totals
+
+def write_results(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel parameter sweep over CRT rule variants")
+    parser.add_argument("csv", nargs="*", help="CSV files with time,o,h,l,c columns (default: the candle store)")
+    parser.add_argument("--store-root", default=CANDLE_STORE_DIR)
+    parser.add_argument("--instruments", help="comma-separated filter for the candle store")
+    parser.add_argument("--granularities", help="comma-separated filter for the candle store")
+    parser.add_argument("--rules", default="strict,loose", help="strict = app.py's check_crt, loose = onada.py's")
+    parser.add_argument("--min-sweep", default="0,0.05,0.1,0.2,0.3", help="min sweep past c1's extreme, x c1 range")
+    parser.add_argument("--min-body", default="0,0.2,0.4,0.6", help="min c2 body / c2 range")
+    parser.add_argument("--sessions", default=','.join(SESSIONS))
+    parser.add_argument("--horizons", default="1,3,5", help="forward return horizons in candles")
+    parser.add_argument("--min-trades", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--out", default="optimize_results.csv")
+    args = parser.parse_args()
+
+    if args.csv:
+        datasets = [('csv', path) for path in args.csv]
+    else:
+        datasets = store_datasets(
+            args.store_root,
+            args.instruments.split(',') if args.instruments else None,
+            args.granularities.split(',') if args.granularities else None,
+        )
+    if not datasets:
+        parser.error("no candle history found - pass CSV files or populate the candle store")
+
+    variants = variant_grid(
+        args.rules.split(','),
+        parse_values(args.min_sweep),
+        parse_values(args.min_body),
+        args.sessions.split(','),
+        parse_values(args.horizons, int),
+    )
+    print(f"🔬 Sweeping {len(variants)} variants x {len(datasets)} dataset(s) on {args.workers} worker(s)...")
+
+    started = time.perf_counter()
+    totals = run_sweep(datasets, variants, args.workers)
+    rows = rank_results(variants, totals, args.min_trades)
+    elapsed = time.perf_counter() - started
+
+    write_results(args.out, rows)
+    print(f"✅ {len(variants) * len(datasets)} evaluations in {elapsed:.1f}s, "
+          f"{len(rows)} variants with >= {args.min_trades} trades -> {args.out}")
+    for row in rows[:args.top]:
+        print(f"   #{row['rank']:<4} {row['rule']:6} sweep>={row['min_sweep']:<5} body>={row['min_body']:<5} "
+              f"{row['session']:8} +{row['horizon']:<3} n={row['trades']:<6} hit={row['hit_rate']:.1%} "
+              f"exp={row['expectancy']*1e4:+.2f}bp")
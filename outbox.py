@@ -0,0 +1,291 @@
+import asyncio
+import os
+import random
+import sqlite3
+import time
+
+from metrics import Gauge
+from subscribers import ROUTE_QUERY, transaction
+from tracing import trace
+
+OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', '4'))
+OUTBOX_BATCH = int(os.getenv('OUTBOX_BATCH', '500'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))
+# Alerts older than this are dropped instead of delivered late
+OUTBOX_MAX_AGE = float(os.getenv('OUTBOX_MAX_AGE', '900'))
+# Claimed rows become visible again after this long (crash mid-send); renewed while a batch is sending
+OUTBOX_LEASE = 60.0
+# Sent-signal keys are kept this long past their candle time (a re-scanned close is caught well within it)
+SIGNAL_DEDUP_TTL = float(os.getenv('SIGNAL_DEDUP_TTL', str(7 * 86400)))
+
+OUTBOX_DEPTH = Gauge('crt_outbox_depth', 'Pending (signal, subscriber) deliveries in the outbox')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox_signals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    message TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outbox_deliveries (
+    signal_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    PRIMARY KEY (signal_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox_deliveries (next_attempt_at);
+CREATE TABLE IF NOT EXISTS sent_signals (
+    instrument TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    candle_time INTEGER NOT NULL,
+    direction TEXT NOT NULL,
+    PRIMARY KEY (instrument, granularity, candle_time, direction)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sent_signals_time ON sent_signals (candle_time);
+"""
+
+# --- Durable outbox: one row per (signal, subscriber), lives next to the subscribers table ---
+class Outbox:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.wakeup = asyncio.Event()
+
+    # Record (instrument, granularity, candle_time, direction) as sent; False if it already was.
+    # Runs inside the enqueue_digest transaction, so a signal is marked sent exactly when it is queued.
+    def _first_send(self, route, candle_time):
+        instrument, granularity, direction = route
+        cur = self.db.execute(
+            "INSERT OR IGNORE INTO sent_signals (instrument, granularity, candle_time, direction) VALUES (?, ?, ?, ?)",
+            (instrument, granularity, candle_time, direction),
+        )
+        return cur.rowcount > 0
+
+    # Oldest candle times go first, measured from the newest one (so replays of old data dedup too)
+    def _evict_sent(self):
+        self.db.execute(
+            "DELETE FROM sent_signals WHERE candle_time < (SELECT MAX(candle_time) FROM sent_signals) - ?",
+            (int(SIGNAL_DEDUP_TTL),)
+        )
+
+    # A batch of (message, route, candle_time) signals -> one digest per subscriber. Subscribers matching
+    # the same set of signals share outbox rows, so a close costs about one send per user instead of one
+    # per (signal, user). Signals already sent for the same candle are skipped (restarts, re-runs).
+    # render(messages) returns the message parts for one set of signals.
+    # Returns the signals that were not duplicates and the queued (signal_id, fanout) messages.
+    def enqueue_digest(self, signals, render):
+        now = time.time()
+        with transaction(self.db, immediate=True):
+            fresh = [s for s in signals if not s[1] or s[2] is None or self._first_send(s[1], s[2])]
+            self._evict_sent()
+            if len(fresh) < len(signals):
+                print(f"🔁 Skipped {len(signals) - len(fresh)} signal(s) already sent for the same candle")
+            signals = fresh
+            self.db.execute("CREATE TEMP TABLE IF NOT EXISTS digest_matches "
+                            "(user_id INTEGER NOT NULL, idx INTEGER NOT NULL)")
+            self.db.execute("DELETE FROM temp.digest_matches")
+            for idx, (_, route, _) in enumerate(signals):
+                if route:
+                    self.db.execute(f"INSERT INTO temp.digest_matches SELECT user_id, ? FROM ({ROUTE_QUERY})",
+                                    (idx,) + tuple(route))
+                else:
+                    self.db.execute("INSERT INTO temp.digest_matches SELECT user_id, ? FROM subscribers "
+                                    "WHERE active = 1 AND blocked = 0", (idx,))
+            groups = {}
+            for user_id, matched in self.db.execute(
+                "SELECT user_id, group_concat(idx) FROM temp.digest_matches GROUP BY user_id"
+            ):
+                groups.setdefault(tuple(sorted(map(int, matched.split(',')))), []).append(user_id)
+
+            queued = []
+            for key, user_ids in groups.items():
+                for part in render([signals[i][0] for i in key]):
+                    cur = self.db.execute("INSERT INTO outbox_signals (message, created_at) VALUES (?, ?)", (part, now))
+                    signal_id = cur.lastrowid
+                    self.db.executemany(
+                        "INSERT INTO outbox_deliveries (signal_id, user_id, next_attempt_at) VALUES (?, ?, ?)",
+                        ((signal_id, user_id, now) for user_id in user_ids),
+                    )
+                    queued.append((signal_id, len(user_ids)))
+            self.db.execute("DELETE FROM temp.digest_matches")
+        if queued:
+            self.wakeup.set()
+        self.update_depth()
+        return signals, queued
+
+    def depth(self):
+        return self.db.execute("SELECT COUNT(*) FROM outbox_deliveries").fetchone()[0]
+
+    def update_depth(self):
+        depth = self.depth()
+        OUTBOX_DEPTH.set(depth)
+        return depth
+
+    # Lease up to `limit` due deliveries of the oldest due signal.
+    # shard = (index, count) only claims users with user_id % count == index (one shard per replica).
+    # SQLite's % keeps the sign of user_id, so it is folded back into [0, count) for group chats (< 0).
+    def claim(self, limit, shard=None):
+        now = time.time()
+        index, count = shard or (0, 1)
+        with transaction(self.db, immediate=True):
+            row = self.db.execute(
+                "SELECT signal_id FROM outbox_deliveries WHERE next_attempt_at <= ? "
+                "AND ((user_id % ?) + ?) % ? = ? ORDER BY next_attempt_at, signal_id LIMIT 1",
+                (now, count, count, count, index)
+            ).fetchone()
+            if row is None:
+                return None, None, []
+            signal_id = row[0]
+            message, created_at = self.db.execute(
+                "SELECT message, created_at FROM outbox_signals WHERE id = ?", (signal_id,)
+            ).fetchone()
+            if now - created_at > OUTBOX_MAX_AGE:
+                dropped = self.db.execute("DELETE FROM outbox_deliveries WHERE signal_id = ?", (signal_id,)).rowcount
+                print(f"🗑️ Dropped {dropped} stale deliveries of signal {signal_id}: {message}")
+                return signal_id, None, []
+            user_ids = [r[0] for r in self.db.execute(
+                "SELECT user_id FROM outbox_deliveries WHERE signal_id = ? AND next_attempt_at <= ? "
+                "AND ((user_id % ?) + ?) % ? = ? LIMIT ?",
+                (signal_id, now, count, count, count, index, limit),
+            )]
+            self.db.executemany(
+                "UPDATE outbox_deliveries SET next_attempt_at = ? WHERE signal_id = ? AND user_id = ?",
+                ((now + OUTBOX_LEASE, signal_id, u) for u in user_ids),
+            )
+            return signal_id, message, user_ids
+
+    # Keep rows claimed while their batch is still sending (a batch can outlast one lease)
+    def renew(self, signal_id, user_ids):
+        until = time.time() + OUTBOX_LEASE
+        with transaction(self.db):
+            self.db.executemany(
+                "UPDATE outbox_deliveries SET next_attempt_at = ? WHERE signal_id = ? AND user_id = ?",
+                ((until, signal_id, u) for u in user_ids),
+            )
+
+    def complete(self, signal_id, user_ids):
+        with transaction(self.db):
+            self.db.executemany(
+                "DELETE FROM outbox_deliveries WHERE signal_id = ? AND user_id = ?",
+                ((signal_id, u) for u in user_ids),
+            )
+
+    # Back off transient failures; give up after OUTBOX_MAX_ATTEMPTS
+    def retry(self, signal_id, failures, backoff=2.0):
+        now = time.time()
+        with transaction(self.db):
+            for user_id, error in failures:
+                self.db.execute(
+                    "UPDATE outbox_deliveries SET attempts = attempts + 1, last_error = ?, "
+                    "next_attempt_at = ? + ? * (1 << attempts) * (0.5 + ?) WHERE signal_id = ? AND user_id = ?",
+                    (str(error)[:200], now, backoff, random.random(), signal_id, user_id),
+                )
+            given_up = self.db.execute(
+                "DELETE FROM outbox_deliveries WHERE signal_id = ? AND attempts >= ?", (signal_id, OUTBOX_MAX_ATTEMPTS)
+            ).rowcount
+        return given_up
+
+    def next_due_in(self):
+        row = self.db.execute("SELECT MIN(next_attempt_at) FROM outbox_deliveries").fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def purge_signals(self):
+        self.db.execute(
+            "DELETE FROM outbox_signals WHERE id NOT IN (SELECT DISTINCT signal_id FROM outbox_deliveries)"
+        )
+
+    async def join(self, poll=0.05):
+        while self.depth():
+            await asyncio.sleep(poll)
+
+# --- Async delivery worker pool draining the outbox ---
+class DeliveryWorkers:
+    # shard() -> (index, count) limits these workers to one replica's share of the subscribers
+    def __init__(self, outbox, broadcaster, subscribers, workers=OUTBOX_WORKERS, batch=OUTBOX_BATCH, shard=None):
+        self.outbox = outbox
+        self.broadcaster = broadcaster
+        self.subscribers = subscribers
+        self.workers = workers
+        self.batch = batch
+        self.shard = shard
+        self.tasks = []
+
+    def start(self):
+        depth = self.outbox.update_depth()
+        if depth:
+            print(f"📬 Resuming {depth} pending deliveries from the outbox")
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def _idle(self):
+        self.outbox.wakeup.clear()
+        timeout = self.outbox.next_due_in()
+        try:
+            await asyncio.wait_for(self.outbox.wakeup.wait(), timeout=min(timeout, 5.0) if timeout is not None else 5.0)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _worker(self):
+        while True:
+            try:
+                signal_id, message, user_ids = self.outbox.claim(self.batch, self.shard() if self.shard else None)
+                if signal_id is None:
+                    await self._idle()
+                    continue
+                if user_ids:
+                    await self._deliver(signal_id, message, user_ids)
+                self.outbox.update_depth()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Outbox worker error: {e}")
+                await asyncio.sleep(1)
+
+    async def _renew(self, signal_id, user_ids):
+        while True:
+            await asyncio.sleep(OUTBOX_LEASE / 3)
+            try:
+                self.outbox.renew(signal_id, user_ids)
+            except sqlite3.Error as e:
+                print(f"❌ Could not renew the lease of signal {signal_id}: {e}")
+
+    async def _deliver(self, signal_id, message, user_ids):
+        # broadcast.py pulls in python-telegram-bot; only delivery needs it
+        from broadcast import is_unreachable
+        # Workers share the broadcaster's rate limits and split its connection pool
+        concurrency = max(1, self.broadcaster.concurrency // self.workers)
+        renewer = asyncio.create_task(self._renew(signal_id, user_ids))
+        try:
+            with trace('deliver', signal_id=signal_id, users=len(user_ids)) as t:
+                stats = await self.broadcaster.broadcast(user_ids, message, concurrency=concurrency)
+                t.set(sent=stats['sent'], failed=stats['failed'])
+        finally:
+            renewer.cancel()
+
+        unreachable = [(u, e) for u, e in stats['failures'] if is_unreachable(e)]
+        transient = [(u, e) for u, e in stats['failures'] if not is_unreachable(e)]
+
+        self.outbox.complete(signal_id, stats['delivered'] + [u for u, _ in unreachable])
+        self.subscribers.mark_delivered(stats['delivered'])
+        if unreachable:
+            self.subscribers.mark_failed(unreachable, blocked=True)
+            print(f"🚫 Marked {len(unreachable)} unreachable users as blocked")
+        if transient:
+            self.subscribers.mark_failed(transient)
+            given_up = self.outbox.retry(signal_id, transient)
+            if given_up:
+                print(f"❌ Gave up on {given_up} deliveries of signal {signal_id}")
+        if not self.outbox.depth():
+            self.outbox.purge_signals()
+
+        print(f"📤 Outbox signal {signal_id}: sent {stats['sent']}/{len(user_ids)} "
+              f"(p50: {stats['p50']*1000:.0f}ms, p99: {stats['p99']*1000:.0f}ms)")
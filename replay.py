@@ -0,0 +1,233 @@
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from bench import summarize
+
+# --- Accelerated, deterministic replay of stored candles through the live pipeline ---
+# python replay.py --from 2024-01-01 --to 2024-07-01 --granularities H1,H4 --subscribers 5000
+# python replay.py --synthetic 200 --from 2024-01-01 --to 2024-03-01 --speed 1000
+
+# Not an Exception: the scheduler logs and skips failed closes, this one has to end its loop
+class ReplayFinished(BaseException):
+    pass
+
+# --- Virtual clock: the scheduler's sleeps advance it instead of waiting ---
+class VirtualClock:
+    def __init__(self, start, speed=None):
+        self.t = start
+        # None runs as fast as possible; N sleeps 1/N of each virtual interval
+        self.speed = speed
+
+    def now(self):
+        return datetime.fromtimestamp(self.t, timezone.utc)
+
+    async def sleep(self, delay):
+        self.t += delay
+        await asyncio.sleep(delay / self.speed if self.speed else 0)
+
+def current_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+# --- Stand-in for AsyncCandleClient that only sees candles up to the virtual now ---
+class ReplayCandleClient:
+    def __init__(self, history, clock, max_connections=20):
+        self.history = history
+        self.clock = clock
+        self.max_connections = max_connections
+        self.series = {}
+        self.requests = 0
+
+    def _series(self, instrument, granularity):
+        from resample import bucket_bounds
+        key = (instrument, granularity)
+        if key not in self.series:
+            batch = self.history(instrument, granularity)
+            self.series[key] = (batch, bucket_bounds(granularity, batch.time)[1] if len(batch) else batch.time)
+        return self.series[key]
+
+    async def candles(self, instrument, params):
+        from candle_store import MAX_CANDLES_PER_REQUEST
+        from fakes import candle_time, parse_time
+        self.requests += 1
+        granularity = params['granularity']
+        batch, ends = self._series(instrument, granularity)
+        now = self.clock.t
+        count = int(params.get('count', 500))
+        # The bar containing `now` is the in-progress one; nothing after it exists yet
+        visible = int(np.searchsorted(batch.time, now, side='right'))
+        if 'from' in params:
+            side = 'right' if params.get('includeFirst') == 'false' else 'left'
+            lo = int(np.searchsorted(batch.time, parse_time(params['from']), side=side))
+            hi = visible
+            if 'to' in params:
+                hi = min(hi, int(np.searchsorted(batch.time, parse_time(params['to']), side='left')))
+            else:
+                hi = min(hi, lo + min(count, MAX_CANDLES_PER_REQUEST))
+        else:
+            hi = visible
+            lo = max(0, hi - count)
+
+        return {'instrument': instrument, 'granularity': granularity, 'candles': [
+            {
+                'complete': bool(ends[i] <= now),
+                'volume': int(batch.volume[i]),
+                'time': candle_time(int(batch.time[i])),
+                'mid': {'o': repr(float(batch.o[i])), 'h': repr(float(batch.h[i])),
+                        'l': repr(float(batch.l[i])), 'c': repr(float(batch.c[i]))},
+            }
+            for i in range(lo, hi)
+        ]}
+
+    async def close(self):
+        pass
+
+# History from a candle store root (e.g. filled by backfill.py)
+def store_history(root):
+    from candle_store import CandleStore
+
+    def history(instrument, granularity):
+        return CandleStore(instrument, granularity, root).batch()
+    return history
+
+# Deterministic synthetic history from the fake OANDA candle generator
+def synthetic_history(start, end, signal_rate):
+    from candles import CandleBatch
+    from fakes import FakeOanda, candle_starts
+    from scanner import GRANULARITY_SECONDS
+    fake = FakeOanda(end, signal_rate=signal_rate)
+
+    def history(instrument, granularity):
+        lookback = 600 * GRANULARITY_SECONDS[granularity]
+        starts = candle_starts(granularity, start - lookback, end + GRANULARITY_SECONDS[granularity])
+        return CandleBatch.from_oanda([fake.candle(instrument, granularity, s) for s in starts])
+    return history
+
+# Records deliveries instead of calling Telegram
+class RecordingBot:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.sent += 1
+
+async def run_replay(args):
+    # Scratch candle store and subscriber DB, set before app.py reads its config
+    work_dir = tempfile.mkdtemp(prefix='crt-replay-')
+    os.environ['CANDLE_STORE_DIR'] = os.path.join(work_dir, 'candles')
+    os.environ['SUBSCRIBERS_DB'] = os.path.join(work_dir, 'subscribers.db')
+    # No legacy users.json import: the replay delivers to exactly --subscribers users
+    os.environ['USERS_FILE'] = os.path.join(work_dir, 'users.json')
+    import scanner
+    from backfill import parse_date
+    from broadcast import Broadcaster
+    from scheduler import CandleCloseScheduler
+
+    start = parse_date(args.start)
+    end = parse_date(args.end)
+    granularities = args.granularities.split(',')
+    if args.synthetic:
+        scanner.WATCHLIST[:] = [f"SYN_{i:04d}" for i in range(args.synthetic)]
+        history = synthetic_history(start, end, args.signal_rate)
+    else:
+        if args.instruments:
+            scanner.WATCHLIST[:] = args.instruments.split(',')
+        history = store_history(args.source)
+
+    quiet = open(os.devnull, 'w')
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else quiet):
+        import app
+    clock = VirtualClock(start, args.speed or None)
+    app.client = ReplayCandleClient(history, clock, max_connections=args.concurrency)
+    bot = RecordingBot()
+    app.telegram_bot = bot
+    app.broadcaster = Broadcaster(bot, concurrency=args.concurrency, global_rate=1e9, per_chat_rate=1e9)
+    app.subscribers.subscribe_many(range(1, args.subscribers + 1))
+    app.start_delivery_workers()
+
+    signals = hashlib.sha256()
+    signal_count = 0
+    publish = app.publish_signal
+
+    def record_signal(message, route=None, candle_time=None):
+        nonlocal signal_count
+        signal_count += 1
+        signals.update(f"{clock.t}:{message}\n".encode())
+        publish(message, route, candle_time)
+    app.publish_signal = record_signal
+
+    cycles = []
+
+    async def on_close(close, due, drift):
+        if close.timestamp() > end:
+            raise ReplayFinished()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else quiet):
+            await app.scan_watchlist(due, closed_at=close)
+            await app.outbox.join(poll=0.002)
+        cycles.append((time.perf_counter() - started, current_rss()))
+        if len(cycles) % args.report_every == 0:
+            print(f"   {close:%Y-%m-%d %H:%M} {len(cycles)} closes, {signal_count} signals, "
+                  f"{bot.sent} deliveries, rss {cycles[-1][1] / 2**20:.0f}MB")
+
+    scheduler = CandleCloseScheduler(granularities, clock=clock.now, sleep=clock.sleep)
+    print(f"⏩ Replaying {args.start} -> {args.end} ({'/'.join(granularities)}) for {len(scanner.WATCHLIST)} "
+          f"instrument(s), {app.subscribers.count()} subscribers...")
+    wall_started = time.perf_counter()
+    try:
+        await scheduler.run(on_close)
+    except ReplayFinished:
+        pass
+    finally:
+        wall = time.perf_counter() - wall_started
+        await app.delivery_workers.stop()
+        app.subscribers.close()
+        quiet.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    latencies = [c[0] for c in cycles]
+    tenth = max(1, len(cycles) // 10)
+    print("\n" + "="*60)
+    print(f"📊 REPLAY: {len(cycles)} closes in {wall:.1f}s wall ({(end - start) / max(wall, 1e-9):.0f}x real time)")
+    print("="*60)
+    print(summarize("close->delivered", latencies))
+    print(summarize("  first 10%", latencies[:tenth]))
+    print(summarize("  last 10%", latencies[-tenth:]))
+    if cycles:
+        print(f"   rss: {cycles[0][1] / 2**20:.1f}MB -> {cycles[-1][1] / 2**20:.1f}MB "
+              f"(peak {max(c[1] for c in cycles) / 2**20:.1f}MB)")
+    print(f"   signals={signal_count} deliveries={bot.sent} oanda_requests={app.client.requests}")
+    # Same inputs give the same digest on every run
+    print(f"   signal digest: {signals.hexdigest()[:16]}")
+    print("="*60 + "\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay historical candle closes through the bot at high speed")
+    parser.add_argument("--from", dest="start", required=True)
+    parser.add_argument("--to", dest="end", required=True)
+    parser.add_argument("--granularities", default="H1")
+    parser.add_argument("--source", default=os.getenv('CANDLE_STORE_DIR', 'data/candles'),
+                        help="candle store root with the history to replay")
+    parser.add_argument("--instruments", help="comma-separated (default: WATCHLIST)")
+    parser.add_argument("--synthetic", type=int, default=0, help="replay N synthetic instruments instead")
+    parser.add_argument("--signal-rate", type=float, default=0.1, help="synthetic: chance a sweep bar forms a CRT")
+    parser.add_argument("--subscribers", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--speed", type=float, default=0, help="virtual seconds per wall second (0 = unbounded)")
+    parser.add_argument("--report-every", type=int, default=500, help="progress line every N closes")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's own per-close logging")
+    asyncio.run(run_replay(parser.parse_args()))
@@ -0,0 +1,115 @@
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+
+from candle_store import CANDLE_STORE_DIR, CandleStore
+from candles import CandleBatch
+from scanner import DAILY_ALIGNMENT_HOUR, GRANULARITY_SECONDS, NEW_YORK
+from scheduler import market_open
+
+# --- Local higher-timeframe candles (H2..H12, D, W) from an H1 or M1 series ---
+# Boundaries follow OANDA's defaults: dailyAlignment=17 and weeklyAlignment=Friday, both New York time
+ALIGNMENT = DAILY_ALIGNMENT_HOUR * 3600
+# Friday 1970-01-02 17:00 as New York wall-clock seconds
+WEEKLY_ANCHOR = 86400 + ALIGNMENT
+WEEK = 7 * 86400
+
+def can_resample(source, granularity):
+    small, large = GRANULARITY_SECONDS[source], GRANULARITY_SECONDS[granularity]
+    return large > small and large % small == 0
+
+# UTC -> New York wall clock offset per timestamp (one zoneinfo lookup per distinct hour)
+def ny_offsets(ts):
+    hours, inverse = np.unique(np.asarray(ts) // 3600, return_inverse=True)
+    offsets = [datetime.fromtimestamp(int(h) * 3600, NEW_YORK).utcoffset().total_seconds() for h in hours]
+    return np.array(offsets, dtype=np.int64)[inverse]
+
+# New York wall clock -> UTC, for bucket boundaries (never inside the 02:00 DST jump)
+def ny_to_utc(local):
+    values, inverse = np.unique(local, return_inverse=True)
+    utc = [int(datetime.fromtimestamp(int(v), timezone.utc).replace(tzinfo=NEW_YORK).timestamp()) for v in values]
+    return np.array(utc, dtype=np.int64)[inverse]
+
+# (start, end) in UTC of the candle containing each timestamp
+def bucket_bounds(granularity, ts):
+    ts = np.asarray(ts, dtype=np.int64)
+    seconds = GRANULARITY_SECONDS[granularity]
+    if seconds <= 3600:
+        starts = ts // seconds * seconds
+        return starts, starts + seconds
+    anchor, period = (WEEKLY_ANCHOR, WEEK) if granularity == 'W' else (ALIGNMENT, seconds)
+    local = ts + ny_offsets(ts)
+    local_starts = (local - anchor) // period * period + anchor
+    return ny_to_utc(local_starts), ny_to_utc(local_starts + period)
+
+def bucket_start(granularity, ts):
+    starts, _ = bucket_bounds(granularity, [int(ts)])
+    return int(starts[0])
+
+# Aggregate a sorted source batch; only candles fully covered by the source are returned
+def resample(batch, granularity, source, until=None):
+    if not len(batch):
+        return CandleBatch.empty()
+    source_seconds = GRANULARITY_SECONDS[source]
+    starts, ends = bucket_bounds(granularity, batch.time)
+    first = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+    last = np.r_[first[1:] - 1, len(batch) - 1]
+
+    resampled = CandleBatch(
+        starts[first],
+        np.asarray(batch.o)[first],
+        np.maximum.reduceat(batch.h, first),
+        np.minimum.reduceat(batch.l, first),
+        np.asarray(batch.c)[last],
+        np.add.reduceat(batch.volume, first),
+    )
+
+    # The series may start mid-candle (unless the market was shut until its first source candle)
+    skip = 0
+    first_time = int(batch.time[0])
+    if first_time != starts[0] and market_open(datetime.fromtimestamp(first_time - source_seconds, timezone.utc)):
+        skip = 1
+    # ... and the last candle is complete only once the source reaches its end
+    if until is None:
+        until = int(batch.time[-1]) + source_seconds
+    stop = int(np.searchsorted(ends[first], until, side='right'))
+    return resampled[skip:stop]
+
+# Last `count` complete candles of `granularity` built from a store of `source` candles
+def resampled_tail(store, granularity, source, until=None, count=2):
+    # One consistent view of the store, even if a backfill rewrites it meanwhile
+    with store.locked(exclusive=False):
+        if not len(store):
+            return []
+        # count candles plus a partial leading one, with room for a weekend
+        span = (count + 1) * GRANULARITY_SECONDS[granularity] + 3 * 86400
+        end = until or store.last_time() + GRANULARITY_SECONDS[source]
+        start = int(np.searchsorted(store.column('time'), end - span))
+        batch = store.batch(start)
+    return list(resample(batch, granularity, source, until)[-count:])
+
+# --- Compare local candles with OANDA's own, both read from the candle store ---
+def verify(instrument, source, granularity, root=CANDLE_STORE_DIR):
+    local = resample(CandleStore(instrument, source, root).batch(), granularity, source)
+    remote = CandleStore(instrument, granularity, root).batch()
+    common, li, ri = np.intersect1d(local.time, remote.time, return_indices=True)
+    mismatched = [int(t) for t, i, j in zip(common, li, ri)
+                  if any(getattr(local, k)[i] != getattr(remote, k)[j] for k in ('o', 'h', 'l', 'c'))]
+    return len(common), mismatched
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check locally resampled candles against OANDA's")
+    parser.add_argument("instrument")
+    parser.add_argument("--source", default="H1")
+    parser.add_argument("--granularities", default="H4,H8,D,W")
+    parser.add_argument("--root", default=CANDLE_STORE_DIR)
+    args = parser.parse_args()
+
+    for granularity in args.granularities.split(','):
+        compared, mismatched = verify(args.instrument, args.source, granularity, args.root)
+        status = "✅" if compared and not mismatched else "⚠️"
+        print(f"{status} {args.instrument} {args.source}->{granularity}: {compared} candles compared, "
+              f"{len(mismatched)} mismatched")
+        for t in mismatched[:5]:
+            print(f"   {datetime.fromtimestamp(t, timezone.utc):%Y-%m-%d %H:%M} UTC")
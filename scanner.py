@@ -0,0 +1,145 @@
+import asyncio
+import os
+import time
+from datetime import timezone
+from zoneinfo import ZoneInfo
+
+from candle_store import CANDLE_STORE_DIR, get_store, sync_store
+from metrics import CRT_EVAL_SECONDS, SCAN_CYCLE_SECONDS
+from tracing import span
+
+# --- Watchlist config ---
+# e.g. WATCHLIST=XAU_USD,EUR_USD,GBP_JPY  GRANULARITIES=M15,H1,H4,D
+WATCHLIST = [i.strip() for i in os.getenv('WATCHLIST', 'XAU_USD').split(',') if i.strip()]
+GRANULARITIES = [g.strip() for g in os.getenv('GRANULARITIES', 'H1').split(',') if g.strip()]
+
+DISPLAY_NAMES = {
+    'XAU_USD': 'GOLD',
+}
+
+GRANULARITY_SECONDS = {
+    'M1': 60, 'M5': 300, 'M15': 900, 'M30': 1800,
+    'H1': 3600, 'H2': 7200, 'H4': 14400, 'H6': 21600, 'H8': 28800, 'H12': 43200,
+    'D': 86400, 'W': 604800,
+}
+
+# How long to keep re-polling right after a close until OANDA marks the candle complete
+COMPLETE_RETRY_DELAY = float(os.getenv('COMPLETE_RETRY_DELAY', '0.25'))
+COMPLETE_RETRY_TIMEOUT = float(os.getenv('COMPLETE_RETRY_TIMEOUT', '30'))
+
+# RESAMPLE_BASE=H1 builds every higher timeframe locally from one H1 sync per instrument
+RESAMPLE_BASE = os.getenv('RESAMPLE_BASE') or None
+
+# OANDA aligns H2+ and daily candles to 17:00 New York (dailyAlignment=17)
+NEW_YORK = ZoneInfo("America/New_York")
+DAILY_ALIGNMENT_HOUR = 17
+
+def display_name(instrument):
+    return DISPLAY_NAMES.get(instrument, instrument.replace('_', '/'))
+
+def candle_closed(granularity, now):
+    now = now.astimezone(timezone.utc)
+    seconds = GRANULARITY_SECONDS[granularity]
+    if seconds <= 3600:
+        return int(now.timestamp()) // 60 * 60 % seconds == 0
+    ny = now.astimezone(NEW_YORK)
+    if ny.minute != 0:
+        return False
+    # Weekly candles open and close at Friday 17:00 New York (weeklyAlignment=Friday)
+    if granularity == 'W':
+        return ny.weekday() == 4 and ny.hour == DAILY_ALIGNMENT_HOUR
+    return (ny.hour - DAILY_ALIGNMENT_HOUR) % (seconds // 3600) == 0
+
+# Right at the close OANDA may still report the candle as in progress
+async def sync_until(client, store, expected_start):
+    deadline = time.monotonic() + COMPLETE_RETRY_TIMEOUT
+    while True:
+        await sync_store(client, store)
+        if expected_start is None or (store.last_time() or 0) >= expected_start:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(COMPLETE_RETRY_DELAY)
+
+# Timeframes resampled from the same store share one sync per close
+_syncs = {}
+
+def shared_sync(client, store, expected_start):
+    entry = _syncs.get(store.path)
+    if entry is None or entry[0] != expected_start or entry[1].cancelled() or \
+            (entry[1].done() and entry[1].exception() is not None):
+        entry = _syncs[store.path] = (expected_start, asyncio.ensure_future(sync_until(client, store, expected_start)))
+    return entry[1]
+
+# --- Sync new candles into the local store and evaluate signal ---
+async def fetch_signal(client, instrument, granularity, check, closed_at=None, root=CANDLE_STORE_DIR, verbose=False,
+                       base=RESAMPLE_BASE):
+    # resample.py needs this module's alignment constants, so import it late
+    from resample import bucket_start, can_resample, resampled_tail
+
+    name = display_name(instrument)
+    source = base if base and can_resample(base, granularity) else granularity
+    store = get_store(instrument, source, root)
+    close = int(closed_at.timestamp()) if closed_at else None
+    # The source candle ending at the close has to be in the store
+    expected_start = bucket_start(source, close - 1) if closed_at else None
+
+    if expected_start is None:
+        await sync_until(client, store, None)
+    elif not await shared_sync(client, store, expected_start):
+        print(f"⚠️ {name}/{source} candle closing {closed_at:%H:%M} UTC never completed.")
+        return None
+
+    if source == granularity:
+        candles = store.tail(2)
+    else:
+        candles = resampled_tail(store, granularity, source, close)
+        if closed_at and candles and candles[-1].time != bucket_start(granularity, close - 1):
+            print(f"⚠️ {name}/{source} history doesn't cover the {granularity} candle closing {closed_at:%H:%M} UTC.")
+            return None
+
+    if len(candles) < 2:
+        print(f"⚠️ Not enough candle data for {name}/{granularity}.")
+        return None
+
+    c1, c2 = candles
+
+    if verbose:
+        print(f"🧪 [TEST] {name}/{granularity} - C1 (setup): {c1}, C2 (sweep): {c2}")
+
+    with CRT_EVAL_SECONDS.time(), span('check_crt', instrument=instrument, granularity=granularity) as s:
+        result = check(c1, c2)
+        s.set(signal=result or None)
+
+    if result:
+        return f"[{name}/{granularity}] {result}"
+    return None
+
+# --- Concurrent scan of every (instrument, granularity) pair ---
+async def scan_cycle(scan_one, pairs, concurrency=20):
+    # Bound in-flight fetches to the HTTP pool so queued requests don't time out
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.monotonic()
+
+    async def run(instrument, granularity):
+        async with semaphore:
+            pair_started = time.monotonic()
+            try:
+                result = await scan_one(instrument, granularity)
+            except Exception as e:
+                print(f"❌ Error scanning {instrument}/{granularity}: {e}")
+                result = None
+            return instrument, granularity, result, time.monotonic() - pair_started
+
+    outcomes = await asyncio.gather(*(run(i, g) for i, g in pairs))
+    elapsed = time.monotonic() - started
+    SCAN_CYCLE_SECONDS.observe(elapsed)
+
+    signals = [(i, g, r) for i, g, r, _ in outcomes if r]
+    slowest = max((o[3] for o in outcomes), default=0.0)
+    print(f"⏱️ Scan cycle: {len(pairs)} pairs in {elapsed:.2f}s "
+          f"(slowest {slowest:.2f}s), {len(signals)} signal(s)")
+    return signals, elapsed
+
+def watchlist_pairs(granularities, instruments=None):
+    return [(i, g) for i in (instruments or WATCHLIST) for g in granularities]
@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from metrics import SCHEDULER_DRIFT_SECONDS
+from scanner import GRANULARITY_SECONDS, NEW_YORK, DAILY_ALIGNMENT_HOUR, candle_closed
+
+# --- Trading hours calendar ---
+# FX trades from Sunday 17:00 to Friday 17:00 New York time (OANDA weekly open/close)
+def market_open(t):
+    ny = t.astimezone(NEW_YORK)
+    weekday = ny.weekday()
+    if weekday == 5:
+        return False
+    if weekday == 4 and ny.hour >= DAILY_ALIGNMENT_HOUR:
+        return False
+    if weekday == 6 and ny.hour < DAILY_ALIGNMENT_HOUR:
+        return False
+    return True
+
+def candle_duration(granularity):
+    return timedelta(seconds=GRANULARITY_SECONDS[granularity])
+
+def next_close(granularity, now):
+    now = now.astimezone(timezone.utc)
+    seconds = GRANULARITY_SECONDS[granularity]
+    if seconds <= 3600:
+        ts = (int(now.timestamp()) // seconds + 1) * seconds
+        return datetime.fromtimestamp(ts, timezone.utc)
+    # H2+ and D follow New York wall-clock hours, so walk hour boundaries (DST-safe)
+    t = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    while not candle_closed(granularity, t):
+        t += timedelta(hours=1)
+    return t
+
+# --- Event-driven candle-close scheduler ---
+class CandleCloseScheduler:
+    def __init__(self, granularities, respect_market_hours=True, clock=None, sleep=None):
+        self.granularities = list(granularities)
+        self.respect_market_hours = respect_market_hours
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self.sleep = sleep or asyncio.sleep
+
+    def _tradable(self, granularity, close):
+        if not self.respect_market_hours:
+            return True
+        # The candle counts if the market was open right before it closed
+        # (a weekly candle opens at Friday 17:00, while the market is shut)
+        return market_open(close - timedelta(seconds=1))
+
+    def next_fire(self, now):
+        t = now
+        while True:
+            closes = {g: next_close(g, t) for g in self.granularities}
+            close = min(closes.values())
+            due = [g for g, c in closes.items() if c == close and self._tradable(g, close)]
+            if due:
+                return close, due
+            t = close
+
+    async def sleep_until(self, target):
+        while True:
+            delay = (target - self.clock()).total_seconds()
+            if delay <= 0:
+                return
+            await self.sleep(delay)
+
+    async def run(self, on_close):
+        # Step from the previous close so a slow cycle never skips a boundary
+        last = self.clock()
+        while True:
+            close, granularities = self.next_fire(last)
+            last = close
+            await self.sleep_until(close)
+            drift = (self.clock() - close).total_seconds()
+            SCHEDULER_DRIFT_SECONDS.observe(drift)
+            # One failed close (locked DB, bad config, OANDA outage) must not stop the ones after it
+            try:
+                await on_close(close, granularities, drift)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ {'/'.join(granularities)} close at {close:%Y-%m-%d %H:%M} UTC failed: {e!r}")
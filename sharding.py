@@ -0,0 +1,155 @@
+import asyncio
+import multiprocessing
+import os
+import time
+import zlib
+from functools import partial
+
+from candle_store import CANDLE_STORE_DIR
+from crt import check_crt
+from governor import OANDA_RATE
+from metrics import SCAN_CYCLE_SECONDS
+from oanda_client import AsyncCandleClient
+from scanner import fetch_signal, scan_cycle
+from tracing import attach, current_context, tracer
+
+# Worker processes for the watchlist scan (0 = scan on the bot's own event loop)
+SCAN_PROCESSES = int(os.getenv('SCAN_PROCESSES', '0'))
+# A shard silent for this long is restarted and skipped for that close (covers COMPLETE_RETRY_TIMEOUT + retries)
+SCAN_SHARD_TIMEOUT = float(os.getenv('SCAN_SHARD_TIMEOUT', '120'))
+
+# Every timeframe of an instrument lands on the same shard, so each candle file has a single writer
+def shard_of(instrument, shards):
+    return zlib.crc32(instrument.encode()) % shards
+
+def shard_pairs(pairs, shards):
+    buckets = [[] for _ in range(shards)]
+    for instrument, granularity in pairs:
+        buckets[shard_of(instrument, shards)].append((instrument, granularity))
+    return buckets
+
+# --- Worker process: own event loop, own OANDA connection pool, fetch + CRT per owned pair ---
+def _shard_main(shard_id, pairs, config, conn):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    client = AsyncCandleClient(**config['client'])
+    check = partial(check_crt, force=config['force'])
+
+    try:
+        while True:
+            command = conn.recv()
+            if command is None:
+                break
+            closed_at, granularities, trace_context = command
+            # Spans from this shard join the coordinator's cycle trace
+            attach(trace_context)
+            due = [(i, g) for i, g in pairs if g in granularities]
+
+            async def scan_one(instrument, granularity):
+                return await fetch_signal(client, instrument, granularity, check, closed_at,
+                                          config['root'], config['verbose'])
+
+            started = time.process_time()
+            signals, elapsed = loop.run_until_complete(scan_cycle(scan_one, due, concurrency=client.max_connections))
+            conn.send((shard_id, signals, elapsed, len(due), time.process_time() - started))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        loop.run_until_complete(client.close())
+        loop.close()
+        # Worker processes leave through os._exit, which skips atexit handlers
+        tracer.close()
+
+def _recv(conn, timeout):
+    if not conn.poll(timeout):
+        raise TimeoutError(f"no reply in {timeout:.0f}s")
+    return conn.recv()
+
+# --- Coordinator: fans a scan out to the shards and merges/dedups their signals ---
+class ShardedScanner:
+    def __init__(self, pairs, processes=SCAN_PROCESSES, client_config=None, force=None, root=CANDLE_STORE_DIR,
+                 verbose=False):
+        self.pairs = pairs
+        self.processes = max(1, processes)
+        # Each worker has its own governor; together they stay under the one OANDA rate
+        client_config = dict(client_config or {})
+        client_config['rate'] = client_config.get('rate', OANDA_RATE) / self.processes
+        self.config = {'client': client_config, 'force': force, 'root': root, 'verbose': verbose}
+        self.workers = []
+
+    # Workers are spawned, not forked: by now the bot runs threads and holds sockets and SQLite handles
+    def start(self):
+        self.workers = [self._spawn(shard_id, pairs)
+                        for shard_id, pairs in enumerate(shard_pairs(self.pairs, self.processes))]
+        sizes = ', '.join(str(len(pairs)) for _, _, pairs in self.workers)
+        print(f"🧩 Scanning {len(self.pairs)} pairs across {self.processes} worker processes ({sizes})")
+
+    def _spawn(self, shard_id, pairs):
+        context = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(target=_shard_main, args=(shard_id, pairs, self.config, child_conn),
+                                  name=f"crt-shard-{shard_id}", daemon=True)
+        process.start()
+        child_conn.close()
+        return process, parent_conn, pairs
+
+    # A hung worker may not react to SIGTERM, so it is killed outright
+    def _restart(self, shard_id):
+        process, conn, pairs = self.workers[shard_id]
+        conn.close()
+        if process.is_alive():
+            process.kill()
+        process.join(timeout=5)
+        self.workers[shard_id] = self._spawn(shard_id, pairs)
+
+    # A dead worker is replaced and its shard retried once; a hung one is replaced and its shard skipped.
+    # Either way the close goes on without it rather than taking the scheduler down.
+    async def _scan_shard(self, shard_id, command):
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            _, conn, pairs = self.workers[shard_id]
+            try:
+                conn.send(command)
+                return await loop.run_in_executor(None, _recv, conn, SCAN_SHARD_TIMEOUT)
+            except TimeoutError as e:
+                print(f"❌ Scan shard {shard_id} hung ({e}), restarting it")
+                self._restart(shard_id)
+                break
+            except (EOFError, OSError) as e:
+                print(f"❌ Scan shard {shard_id} worker died ({e!r}), restarting it")
+                self._restart(shard_id)
+        print(f"⚠️ Skipped {len(pairs)} pairs of shard {shard_id} this close")
+        return shard_id, [], 0.0, 0, 0.0
+
+    async def scan(self, granularities, closed_at=None):
+        started = time.monotonic()
+        command = (closed_at, list(granularities), current_context())
+        results = await asyncio.gather(*(self._scan_shard(i, command) for i in range(len(self.workers))))
+        elapsed = time.monotonic() - started
+        SCAN_CYCLE_SECONDS.observe(elapsed)
+
+        # Shards own disjoint pairs, but a watchlist listing an instrument twice would alert twice
+        seen = set()
+        signals = []
+        for shard_id, shard_signals, shard_elapsed, scanned, cpu in sorted(results):
+            print(f"   🧩 shard {shard_id}: {scanned} pairs in {shard_elapsed:.2f}s "
+                  f"(cpu {cpu:.2f}s), {len(shard_signals)} signal(s)")
+            for instrument, granularity, msg in shard_signals:
+                if (instrument, granularity) not in seen:
+                    seen.add((instrument, granularity))
+                    signals.append((instrument, granularity, msg))
+        print(f"⏱️ Sharded scan: {sum(r[3] for r in results)} pairs in {elapsed:.2f}s, {len(signals)} signal(s)")
+        return signals, elapsed
+
+    def stop(self):
+        for process, conn, _ in self.workers:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process, conn, _ in self.workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self.workers = []
@@ -0,0 +1,184 @@
+import asyncio
+import csv
+import json
+
+import aiohttp
+
+from candles import Candle
+from metrics import CRT_EVAL_SECONDS
+from oanda_client import parse_candle_time
+from resample import bucket_bounds
+from scheduler import CandleCloseScheduler
+
+STREAM_HOSTS = {
+    'practice': 'https://stream-fxpractice.oanda.com',
+    'live': 'https://stream-fxtrade.oanda.com',
+}
+
+# OANDA-aligned (start, end) of the candle a tick belongs to (DST-exact for D and W)
+def candle_bounds(granularity, ts):
+    starts, ends = bucket_bounds(granularity, [int(ts)])
+    return int(starts[0]), int(ends[0])
+
+# --- OANDA pricing stream -> (instrument, unix time, mid price) ---
+async def price_stream(access_token, account_id, instruments, environment='practice', base_url=None):
+    url = f"{(base_url or STREAM_HOSTS[environment]).rstrip('/')}/v3/accounts/{account_id}/pricing/stream"
+    headers = {'Authorization': f'Bearer {access_token}', 'Accept-Datetime-Format': 'RFC3339'}
+    # No total timeout: the stream stays open, OANDA sends a heartbeat every 5s
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=30)
+
+    async with aiohttp.ClientSession(headers=headers, timeout=timeout) as session:
+        async with session.get(url, params={'instruments': ','.join(instruments)}) as resp:
+            resp.raise_for_status()
+            async for line in resp.content:
+                if not line.strip():
+                    continue
+                msg = json.loads(line)
+                if msg.get('type') != 'PRICE' or not msg.get('bids') or not msg.get('asks'):
+                    continue
+                mid = (float(msg['bids'][0]['price']) + float(msg['asks'][0]['price'])) / 2
+                yield msg['instrument'], parse_candle_time(msg['time']).timestamp(), mid
+
+# --- Local replay of recorded ticks (CSV: instrument,time,mid) standing in for the live feed ---
+async def replay_stream(ticks, speed=None):
+    previous = None
+    for instrument, t, mid in ticks:
+        if speed and previous is not None and t > previous:
+            await asyncio.sleep((t - previous) / speed)
+        previous = t
+        yield instrument, t, mid
+
+def load_ticks(path):
+    with open(path, newline='') as f:
+        return [(r['instrument'], float(r['time']), float(r['mid'])) for r in csv.DictReader(f)]
+
+# A candle still being built from ticks; `end` is its close time.
+# `partial` bars may have missed ticks (opened mid-bar at startup, or open across a stream reconnect).
+class LiveBar(Candle):
+    __slots__ = ('end', 'partial')
+
+    def __init__(self, time, end, price, partial=False):
+        super().__init__(time, price, price, price, price, 1)
+        self.end = end
+        self.partial = partial
+
+# --- Tick -> mid candle aggregation ---
+class CandleBuilder:
+    def __init__(self, granularities):
+        self.granularities = list(granularities)
+        self.bars = {}
+        self.previous = {}
+
+    def on_tick(self, instrument, t, price):
+        closed = []
+        for granularity in self.granularities:
+            key = (instrument, granularity)
+            bar = self.bars.get(key)
+            # Fast path: tick falls inside the open bar
+            if bar is not None and bar.time <= t < bar.end:
+                if price > bar.h:
+                    bar.h = price
+                elif price < bar.l:
+                    bar.l = price
+                bar.c = price
+                bar.volume += 1
+                continue
+
+            start, end = candle_bounds(granularity, t)
+            previous = self.previous.get(key)
+            if previous is not None and previous.time >= start:
+                # Late tick for a bar the boundary timer already closed
+                continue
+            if bar is not None:
+                closed.append(self._close(key))
+            # The first bar of an instrument only holds the ticks since the stream opened
+            self.bars[key] = LiveBar(start, end, price, partial=bar is None and previous is None)
+        return closed
+
+    # The stream (re)opened: ticks of the bars open now may have been missed
+    def mark_gap(self):
+        for bar in self.bars.values():
+            bar.partial = True
+
+    # Close every bar whose end is at or before `now` (called at the exact boundary)
+    def flush(self, now):
+        closed = []
+        for key, bar in list(self.bars.items()):
+            if bar.end <= now:
+                closed.append(self._close(key))
+        return closed
+
+    def _close(self, key):
+        bar = self.bars.pop(key)
+        previous = self.previous.get(key)
+        self.previous[key] = bar
+        return key[0], key[1], previous, bar
+
+# --- Streaming CRT detector ---
+class StreamingDetector:
+    # on_batch() runs after the signals of each boundary have all gone to on_signal
+    def __init__(self, granularities, check, on_signal, reconcile=None, reconcile_delay=5.0, on_batch=None):
+        self.builder = CandleBuilder(granularities)
+        self.granularities = list(granularities)
+        self.check = check
+        self.on_signal = on_signal
+        self.on_batch = on_batch
+        self.reconcile = reconcile
+        self.reconcile_delay = reconcile_delay
+        self.tasks = set()
+
+    # Only two whole, back-to-back bars make a CRT (no partial first bar, no tickless bar in between)
+    def _comparable(self, c1, c2):
+        return c1 is not None and not c1.partial and not c2.partial and c1.end == c2.time
+
+    async def _handle_closed(self, closed):
+        for instrument, granularity, c1, c2 in closed:
+            if not self._comparable(c1, c2):
+                continue
+            with CRT_EVAL_SECONDS.time():
+                result = self.check(c1, c2)
+            if result:
+                await self.on_signal(instrument, granularity, result, c2, c2.end)
+            if self.reconcile:
+                task = asyncio.create_task(self._reconcile_later(instrument, granularity, c1, c2, result))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        if self.on_batch:
+            self.on_batch()
+
+    async def _reconcile_later(self, instrument, granularity, c1, c2, result):
+        await asyncio.sleep(self.reconcile_delay)
+        try:
+            await self.reconcile(instrument, granularity, c1, c2, result)
+        except Exception as e:
+            print(f"⚠️ Reconcile failed for {instrument}/{granularity}: {e}")
+
+    async def on_tick(self, instrument, t, price):
+        closed = self.builder.on_tick(instrument, t, price)
+        if closed:
+            # A tick past the boundary beat the timer: close every instrument's bar there, so one digest covers them all
+            closed += self.builder.flush(t)
+            await self._handle_closed(closed)
+
+    async def consume(self, stream):
+        self.builder.mark_gap()
+        async for instrument, t, price in stream:
+            await self.on_tick(instrument, t, price)
+
+    # Close bars at the boundary even when no tick arrives right after it
+    async def run_timer(self, respect_market_hours=True):
+        async def on_close(close, granularities, drift):
+            await self._handle_closed(self.builder.flush(close.timestamp()))
+
+        await CandleCloseScheduler(self.granularities, respect_market_hours).run(on_close)
+
+    async def run(self, stream, respect_market_hours=True):
+        timer = asyncio.create_task(self.run_timer(respect_market_hours))
+        try:
+            await self.consume(stream)
+        finally:
+            timer.cancel()
+
+# Compare locally built candles with OANDA's REST candles (relative tolerance for mid rounding)
+def candles_match(local, rest, tolerance=1e-5):
+    return all(abs(getattr(local, k) - getattr(rest, k)) <= tolerance * abs(getattr(rest, k)) for k in ('o', 'h', 'l', 'c'))
@@ -0,0 +1,208 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+SUBSCRIBERS_DB = os.getenv('SUBSCRIBERS_DB', 'subscribers.db')
+PAGE_SIZE = int(os.getenv('SUBSCRIBERS_PAGE_SIZE', '1000'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscribers (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT,
+    subscribed_at REAL NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    last_delivery REAL,
+    failures INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS subscribers_deliverable ON subscribers (user_id) WHERE active = 1 AND blocked = 0;
+CREATE TABLE IF NOT EXISTS subscriptions (
+    instrument TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (instrument, granularity, direction, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS subscriptions_user ON subscriptions (user_id);
+"""
+
+# Routing rules: '*' matches any instrument / timeframe / direction
+ANY = '*'
+WATCH_ALL = (ANY, ANY, ANY)
+
+# Inverted index lookup: each IN (?, '*') is a primary-key range, so a signal costs O(matching rules)
+ROUTE_QUERY = (
+    "SELECT DISTINCT r.user_id FROM subscriptions r JOIN subscribers s ON s.user_id = r.user_id "
+    "WHERE r.instrument IN (?, '*') AND r.granularity IN (?, '*') AND r.direction IN (?, '*') "
+    "AND s.active = 1 AND s.blocked = 0"
+)
+
+# BEGIN ... COMMIT that rolls back if anything raises: connections are shared and long-lived,
+# so a transaction left open would make every later BEGIN fail
+@contextmanager
+def transaction(db, immediate=False):
+    db.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield db
+        db.execute("COMMIT")
+    except BaseException:
+        if db.in_transaction:
+            db.execute("ROLLBACK")
+        raise
+
+# --- SQLite (WAL) subscriber store ---
+class SubscriberStore:
+    def __init__(self, path=SUBSCRIBERS_DB):
+        self.path = path
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        # Subscribers from before routing existed get the catch-all rule, once
+        if self.db.execute("PRAGMA user_version").fetchone()[0] < 1:
+            with transaction(self.db):
+                self.db.execute(
+                    "INSERT OR IGNORE INTO subscriptions (instrument, granularity, direction, user_id) "
+                    "SELECT '*', '*', '*', user_id FROM subscribers "
+                    "WHERE user_id NOT IN (SELECT user_id FROM subscriptions)"
+                )
+                self.db.execute("PRAGMA user_version = 1")
+
+    # New subscribers (and returning ones without rules) get every signal
+    def _default_rules(self, user_ids):
+        self.db.executemany(
+            "INSERT INTO subscriptions (instrument, granularity, direction, user_id) "
+            "SELECT '*', '*', '*', ? WHERE NOT EXISTS (SELECT 1 FROM subscriptions WHERE user_id = ?)",
+            ((u, u) for u in user_ids),
+        )
+
+    # Returns True for a new (or returning) subscriber, False if already active
+    def subscribe(self, user_id, username=None):
+        with transaction(self.db):
+            cur = self.db.execute(
+                "INSERT INTO subscribers (user_id, username, subscribed_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET active = 1, blocked = 0, failures = 0, "
+                "username = COALESCE(excluded.username, username) "
+                "WHERE active = 0 OR blocked = 1",
+                (user_id, username, time.time()),
+            )
+            self._default_rules([user_id])
+        return cur.rowcount > 0
+
+    def subscribe_many(self, user_ids):
+        user_ids = list(user_ids)
+        now = time.time()
+        with transaction(self.db):
+            self.db.executemany(
+                "INSERT OR IGNORE INTO subscribers (user_id, subscribed_at) VALUES (?, ?)",
+                ((user_id, now) for user_id in user_ids),
+            )
+            self._default_rules(user_ids)
+
+    def unsubscribe(self, user_id):
+        cur = self.db.execute("UPDATE subscribers SET active = 0 WHERE user_id = ? AND active = 1", (user_id,))
+        return cur.rowcount > 0
+
+    def is_subscribed(self, user_id):
+        row = self.db.execute(
+            "SELECT 1 FROM subscribers WHERE user_id = ? AND active = 1 AND blocked = 0", (user_id,)
+        ).fetchone()
+        return row is not None
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM subscribers WHERE active = 1 AND blocked = 0").fetchone()[0]
+
+    # Keyset pagination, so each page is an index range scan regardless of table size
+    def pages(self, page_size=PAGE_SIZE):
+        last = None
+        while True:
+            if last is None:
+                rows = self.db.execute(
+                    "SELECT user_id FROM subscribers WHERE active = 1 AND blocked = 0 "
+                    "ORDER BY user_id LIMIT ?", (page_size,)
+                ).fetchall()
+            else:
+                rows = self.db.execute(
+                    "SELECT user_id FROM subscribers WHERE active = 1 AND blocked = 0 AND user_id > ? "
+                    "ORDER BY user_id LIMIT ?", (last, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield [r[0] for r in rows]
+            last = rows[-1][0]
+
+    def iter_ids(self, page_size=PAGE_SIZE):
+        for page in self.pages(page_size):
+            yield from page
+
+    # --- Subscription routing ---
+    # A specific rule replaces the catch-all; watching everything again drops the specific ones
+    def watch(self, user_id, instrument=ANY, granularity=ANY, direction=ANY):
+        rule = (instrument, granularity, direction)
+        with transaction(self.db):
+            if rule == WATCH_ALL:
+                self.db.execute("DELETE FROM subscriptions WHERE user_id = ?", (user_id,))
+            else:
+                self.db.execute(
+                    "DELETE FROM subscriptions WHERE user_id = ? AND instrument = '*' AND granularity = '*' "
+                    "AND direction = '*'", (user_id,)
+                )
+            cur = self.db.execute(
+                "INSERT OR IGNORE INTO subscriptions (instrument, granularity, direction, user_id) VALUES (?, ?, ?, ?)",
+                rule + (user_id,),
+            )
+        return cur.rowcount > 0
+
+    # Removing the last rule falls back to every signal (use unsubscribe to stop them all)
+    def unwatch(self, user_id, instrument=ANY, granularity=ANY, direction=ANY):
+        with transaction(self.db):
+            cur = self.db.execute(
+                "DELETE FROM subscriptions WHERE instrument = ? AND granularity = ? AND direction = ? AND user_id = ?",
+                (instrument, granularity, direction, user_id),
+            )
+            self._default_rules([user_id])
+        return cur.rowcount > 0
+
+    def watches(self, user_id):
+        return self.db.execute(
+            "SELECT instrument, granularity, direction FROM subscriptions WHERE user_id = ? "
+            "ORDER BY instrument, granularity, direction", (user_id,)
+        ).fetchall()
+
+    # --- Per-user delivery state ---
+    def mark_delivered(self, user_ids):
+        now = time.time()
+        with transaction(self.db):
+            self.db.executemany(
+                "UPDATE subscribers SET last_delivery = ?, failures = 0 WHERE user_id = ?",
+                ((now, user_id) for user_id in user_ids),
+            )
+
+    def mark_failed(self, failures, blocked=False):
+        with transaction(self.db):
+            self.db.executemany(
+                "UPDATE subscribers SET failures = failures + 1, last_error = ?, blocked = ? WHERE user_id = ?",
+                ((str(error)[:200], 1 if blocked else 0, user_id) for user_id, error in failures),
+            )
+
+    # One-time import of the legacy users.json
+    def migrate_from_json(self, path):
+        try:
+            with open(path, 'r') as f:
+                users = json.load(f).get('authorized_users', [])
+        except FileNotFoundError:
+            return 0
+        except json.JSONDecodeError:
+            print(f"⚠️ Error reading {path}, skipping migration")
+            return 0
+        self.subscribe_many(users)
+        return len(users)
+
+    def is_empty(self):
+        return self.db.execute("SELECT 1 FROM subscribers LIMIT 1").fetchone() is None
+
+    def close(self):
+        self.db.close()
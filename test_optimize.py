@@ -0,0 +1,18 @@
+import numpy as np
+
+from optimize import candle_features, parse_values
+
+def test_parse_values_range_applies_cast():
+    horizons = parse_values("1:5:3", int)
+    assert horizons == [1, 3, 5]
+    assert all(type(h) is int for h in horizons)
+
+def test_parse_values_range_defaults_to_float():
+    assert parse_values("0:1:3") == [0.0, 0.5, 1.0]
+
+def test_range_horizons_slice_forward_returns():
+    close = np.linspace(1.0, 2.0, 20)
+    arrays = {'o': close, 'h': close + 0.1, 'l': close - 0.1, 'c': close, 'time': np.arange(20) * 3600}
+    features = candle_features(arrays, parse_values("1:5:3", int))
+    assert sorted(features['forward']) == [1, 3, 5]
+    assert features['forward'][3][0] == (close[4] - close[1]) / close[1]
@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime, timezone
+
+from streaming import StreamingDetector
+
+def ts(text):
+    return datetime.strptime(text, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+
+# Feeds ticks to an H1 detector whose check flags every pair it is given
+def evaluated_pairs(ticks, reconnect_at=None):
+    pairs = []
+
+    def check(c1, c2):
+        pairs.append((c1.time, c2.time))
+        return "🟢 Bullish CRT"
+
+    async def on_signal(instrument, granularity, result, bar, closed_at):
+        pass
+
+    async def run():
+        detector = StreamingDetector(['H1'], check, on_signal)
+        for i, (t, price) in enumerate(ticks):
+            if i == reconnect_at:
+                detector.builder.mark_gap()
+            await detector.on_tick('EUR_USD', ts(t), price)
+
+    asyncio.run(run())
+    return [(datetime.fromtimestamp(a, timezone.utc).hour, datetime.fromtimestamp(b, timezone.utc).hour)
+            for a, b in pairs]
+
+def test_partial_first_bar_is_not_c1():
+    # Stream opens at 09:59:50: the 09:00 bar only has two ticks
+    ticks = [("2024-01-02 09:59:50", 1.10), ("2024-01-02 09:59:55", 1.11),
+             ("2024-01-02 10:00:01", 1.12), ("2024-01-02 10:30:00", 1.09), ("2024-01-02 10:59:59", 1.115),
+             ("2024-01-02 11:00:01", 1.12)]
+    assert evaluated_pairs(ticks) == []
+
+def test_whole_back_to_back_bars_are_evaluated():
+    ticks = [("2024-01-02 08:59:59", 1.10),
+             ("2024-01-02 09:00:01", 1.10), ("2024-01-02 09:59:59", 1.11),
+             ("2024-01-02 10:00:01", 1.12), ("2024-01-02 10:59:59", 1.115),
+             ("2024-01-02 11:00:01", 1.12)]
+    assert evaluated_pairs(ticks) == [(9, 10)]
+
+def test_bar_without_ticks_breaks_the_pair():
+    # No tick during 10:00-11:00, so the 09:00 bar is not the candle before 11:00
+    ticks = [("2024-01-02 08:59:59", 1.10),
+             ("2024-01-02 09:00:01", 1.10), ("2024-01-02 09:59:59", 1.11),
+             ("2024-01-02 11:00:01", 1.12), ("2024-01-02 11:59:59", 1.115),
+             ("2024-01-02 12:00:01", 1.12)]
+    assert evaluated_pairs(ticks) == []
+
+def test_bar_open_across_a_reconnect_is_not_used():
+    ticks = [("2024-01-02 08:59:59", 1.10),
+             ("2024-01-02 09:00:01", 1.10), ("2024-01-02 09:40:00", 1.11),
+             ("2024-01-02 10:00:01", 1.12), ("2024-01-02 10:59:59", 1.115),
+             ("2024-01-02 11:00:01", 1.12), ("2024-01-02 11:59:59", 1.13),
+             ("2024-01-02 12:00:01", 1.12)]
+    # Reconnect while the 09:00 bar is open: 09/10 is skipped, 10/11 is still evaluated
+    assert evaluated_pairs(ticks, reconnect_at=2) == [(10, 11)]
+
+def test_one_boundary_is_one_batch():
+    # EUR_USD's first tick past 11:00 arrives before the timer: GBP_USD's 10:00 bar closes with it
+    batches = [[]]
+
+    async def on_signal(instrument, granularity, result, bar, closed_at):
+        batches[-1].append(instrument)
+
+    async def run():
+        detector = StreamingDetector(['H1'], lambda c1, c2: "🟢 Bullish CRT", on_signal,
+                                     on_batch=lambda: batches.append([]))
+        for t in ("2024-01-02 08:59:59", "2024-01-02 09:00:01", "2024-01-02 10:00:01", "2024-01-02 11:00:01"):
+            for instrument in ('EUR_USD', 'GBP_USD'):
+                await detector.on_tick(instrument, ts(t), 1.10)
+
+    asyncio.run(run())
+    assert [b for b in batches if b] == [['EUR_USD', 'GBP_USD']]
@@ -0,0 +1,185 @@
+import argparse
+import atexit
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+# --- Lightweight span tracing to a JSONL file ---
+# TRACE_SAMPLE=0.1 records every span of 10% of cycles/deliveries (0 = off), appended to TRACE_FILE:
+# {"trace": "9f..", "span": 3, "parent": 1, "name": "oanda.request", "t": 1234.5678, "dur": 0.0421, ...attrs}
+# `t` is time.monotonic() at span start; root spans also carry `wall` (time.time()) to line traces up.
+# python tracing.py summarize trace.jsonl
+TRACE_FILE = os.getenv('TRACE_FILE', 'trace.jsonl')
+TRACE_SAMPLE = float(os.getenv('TRACE_SAMPLE', '0'))
+# Spans are written by a background thread at most this often, in batches of up to TRACE_BATCH lines
+TRACE_FLUSH_INTERVAL = float(os.getenv('TRACE_FLUSH_INTERVAL', '1'))
+TRACE_BATCH = 1000
+
+try:
+    from orjson import dumps as _dumps
+except ImportError:
+    def _dumps(record):
+        return json.dumps(record, separators=(',', ':')).encode()
+
+# (trace_id, span_id) of the enclosing span; None outside a sampled trace
+_current = contextvars.ContextVar('trace_span', default=None)
+
+class Span:
+    __slots__ = ('tracer', 'name', 'attrs', 'ids', 'token', 'started', 'root')
+
+    def __init__(self, tracer, name, attrs, ids=None, root=False):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        # (trace_id, span_id, parent_id), or None when not recording
+        self.ids = ids
+        self.root = root
+
+    def set(self, **attrs):
+        if self.ids is not None:
+            self.attrs.update(attrs)
+
+    def __enter__(self):
+        if self.ids is None and not self.root:
+            parent = _current.get()
+            if parent is not None:
+                self.ids = (parent[0], self.tracer.next_id(), parent[1])
+        if self.ids is not None:
+            self.token = _current.set(self.ids[:2])
+            self.started = time.monotonic()
+        elif self.root:
+            # An unsampled root hides any outer trace from its children
+            self.token = _current.set(None)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.ids is None:
+            if self.root:
+                _current.reset(self.token)
+            return False
+        duration = time.monotonic() - self.started
+        _current.reset(self.token)
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.tracer.emit(self.ids, self.name, self.started, duration, self.attrs,
+                         wall=time.time() - duration if self.root else None)
+        return False
+
+class Tracer:
+    def __init__(self, path=TRACE_FILE, sample_rate=TRACE_SAMPLE, flush_interval=TRACE_FLUSH_INTERVAL):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self.pid = None
+        self.queue = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    # Random, so spans from forked scan workers never collide with the parent's
+    def next_id(self):
+        return random.getrandbits(48)
+
+    # Start of a cycle (or delivery); sampled as a whole
+    def trace(self, name, **attrs):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return Span(self, name, attrs, root=True)
+        return Span(self, name, attrs, ids=(f"{random.getrandbits(64):016x}", self.next_id(), None), root=True)
+
+    # Child of the current span; a no-op outside a sampled trace
+    def span(self, name, **attrs):
+        return Span(self, name, attrs)
+
+    # A span that already happened, ending now (e.g. how late the scheduler woke)
+    def event(self, name, duration, **attrs):
+        parent = _current.get()
+        if parent is not None:
+            self.emit((parent[0], self.next_id(), parent[1]), name, time.monotonic() - duration, duration, attrs)
+
+    def emit(self, ids, name, started, duration, attrs, wall=None):
+        record = {'trace': ids[0], 'span': ids[1], 'parent': ids[2], 'name': name,
+                  't': round(started, 6), 'dur': round(duration, 6)}
+        if wall is not None:
+            record['wall'] = round(wall, 3)
+        record.update(attrs)
+        self._writer().put(record)
+
+    # --- Background batched appends (one writer thread per process, restarted after fork) ---
+    def _writer(self):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.queue = queue.SimpleQueue()
+                    self.thread = threading.Thread(target=self._write_loop, args=(self.queue,), daemon=True)
+                    self.thread.start()
+                    self.pid = os.getpid()
+        return self.queue
+
+    def _write_loop(self, records):
+        while True:
+            batch = [records.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < TRACE_BATCH and batch[-1] is not None:
+                try:
+                    batch.append(records.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            done = batch[-1] is None
+            lines = [_dumps(r) + b'\n' for r in batch if r is not None]
+            if lines:
+                try:
+                    with open(self.path, 'ab') as f:
+                        f.write(b''.join(lines))
+                except OSError as e:
+                    print(f"⚠️ Could not write {len(lines)} trace spans to {self.path}: {e}")
+            if done:
+                return
+
+    # Write out whatever is queued (called at exit)
+    def close(self, timeout=2.0):
+        if self.thread is not None and self.pid == os.getpid():
+            self.queue.put(None)
+            self.thread.join(timeout)
+            self.pid = None
+
+tracer = Tracer()
+trace = tracer.trace
+span = tracer.span
+atexit.register(tracer.close)
+
+# Hand the current span to another process (sharded scan workers) and resume it there
+def current_context():
+    return _current.get()
+
+def attach(context):
+    _current.set(context)
+
+# --- Summary: per-stage latency breakdown ---
+def load_spans(path):
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def summarize_trace(path):
+    from bench import summarize
+    by_name = {}
+    traces = set()
+    for record in load_spans(path):
+        by_name.setdefault(record['name'], []).append(record['dur'])
+        traces.add(record['trace'])
+    print(f"📊 {sum(len(d) for d in by_name.values())} spans in {len(traces)} trace(s) from {path}")
+    for name, durations in sorted(by_name.items(), key=lambda kv: -sum(kv[1])):
+        print(f"{summarize(name, durations)} total={sum(durations):8.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CRT bot trace tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary = sub.add_parser("summarize", help="per-stage latency breakdown of a trace file")
+    summary.add_argument("path", nargs="?", default=TRACE_FILE)
+    args = parser.parse_args()
+    if args.command == "summarize":
+        summarize_trace(args.path)